@@ -0,0 +1,186 @@
+"""
+Per-user conversation memory for the coach chat.
+
+Each user gets a rolling window of recent messages, a running summary of the
+older ones, and a snapshot of their stats (recent steps, active minutes,
+completed quests) for the prompt context.
+
+- Once the window holds more than max_turns messages, the older half is folded
+  into the summary by a background task, so the chat reply never waits for it.
+  If summarising fails, the old messages are folded in as shortened text.
+- The stats snapshot is fetched from the backend on a user's first message and
+  refreshed in the background once it is older than stats_ttl; messages are
+  answered with the snapshot at hand meanwhile. Context sent with a request
+  replaces the snapshot.
+
+Conversations live in memory, least recently active dropped first beyond
+max_users, and start over after idle_ttl seconds without a message.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+# Characters kept per message when summarising without the model
+FALLBACK_TURN_CHARS = 120
+FALLBACK_SUMMARY_CHARS = 800
+
+
+def user_context(health_data, quests) -> dict:
+    """Chat context from the /journey/{id} health series and the /quests/{id} response."""
+    context = {}
+    if health_data:
+        latest = health_data[-1]
+        context = {
+            "steps": latest.get("steps") or 0,
+            "active_minutes": latest.get("workout_minutes") or 0
+        }
+    if quests is not None:
+        context["completed_quests"] = sum(1 for q in quests if q.get("completed"))
+    return context
+
+
+def fallback_summary(summary: str | None, turns: list) -> str:
+    """Summary built without the model: the old summary plus shortened messages, newest text kept."""
+    parts = [summary] if summary else []
+    parts += [f"{role}: {text[:FALLBACK_TURN_CHARS]}" for role, text in turns]
+    return " | ".join(parts)[-FALLBACK_SUMMARY_CHARS:]
+
+
+class Conversation:
+    def __init__(self):
+        self.summary = None
+        self.turns = []  # (role, text), oldest first; role is "user" or "coach"
+        self.stats = None
+        self.stats_at = 0.0
+        self.last_active = time.monotonic()
+        self.refreshing = False
+        self.compacting = False
+
+
+class ConversationStore:
+    """
+    fetch_stats: async callable user_id -> context dict.
+    summarise:   async callable (summary, turns) -> new summary.
+    """
+
+    def __init__(self, max_users: int = 10000, max_turns: int = 12, idle_ttl: float = 86400.0,
+                 stats_ttl: float = 300.0, fetch_stats=None, summarise=None):
+        self.max_users = max_users
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.stats_ttl = stats_ttl
+        self.fetch_stats = fetch_stats
+        self.summarise = summarise
+        self._conversations = OrderedDict()  # user_id -> Conversation
+        self._tasks = set()  # background refreshes and compactions
+        self.stats_fetches = 0
+        self.stats_errors = 0
+        self.compactions = 0
+        self.summary_errors = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_users > 0
+
+    def _get(self, user_id: int) -> Conversation:
+        conversation = self._conversations.get(user_id)
+        now = time.monotonic()
+        if conversation is None or now - conversation.last_active > self.idle_ttl:
+            conversation = self._conversations[user_id] = Conversation()
+        conversation.last_active = now
+        self._conversations.move_to_end(user_id)
+        while len(self._conversations) > self.max_users:
+            self._conversations.popitem(last=False)
+            self.evictions += 1
+        return conversation
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, user_id: int, conversation: Conversation):
+        try:
+            conversation.stats = await self.fetch_stats(user_id)
+            self.stats_fetches += 1
+        except Exception as e:
+            self.stats_errors += 1
+            print(f"Fetching stats for user {user_id} failed, keeping the old snapshot: {e}")
+        finally:
+            conversation.stats_at = time.monotonic()
+            conversation.refreshing = False
+
+    async def context(self, user_id: int, client_context: dict | None = None) -> dict | None:
+        """Stats for the prompt: the client's if sent, else the (possibly stale) snapshot."""
+        if not self.enabled:
+            return client_context
+        conversation = self._get(user_id)
+        if client_context:
+            conversation.stats, conversation.stats_at = client_context, time.monotonic()
+            return client_context
+        if self.fetch_stats is None or conversation.refreshing:
+            return conversation.stats
+
+        conversation.refreshing = True
+        if conversation.stats is None and conversation.stats_at == 0.0:
+            # First message: nothing to answer with yet, so wait once
+            await self._refresh(user_id, conversation)
+        elif time.monotonic() - conversation.stats_at > self.stats_ttl:
+            self._spawn(self._refresh(user_id, conversation))
+        else:
+            conversation.refreshing = False
+        return conversation.stats
+
+    def history(self, user_id: int) -> dict | None:
+        """{"summary", "turns"} for the prompt, or None before the first exchange."""
+        conversation = self._conversations.get(user_id) if self.enabled else None
+        if conversation is None or not (conversation.summary or conversation.turns):
+            return None
+        return {"summary": conversation.summary, "turns": [list(turn) for turn in conversation.turns]}
+
+    def add_exchange(self, user_id: int, message: str, answer: str):
+        if not self.enabled:
+            return
+        conversation = self._get(user_id)
+        conversation.turns += [("user", message), ("coach", answer)]
+        if len(conversation.turns) > self.max_turns and not conversation.compacting:
+            conversation.compacting = True
+            self._spawn(self._compact(conversation))
+
+    async def _compact(self, conversation: Conversation):
+        """Folds all but the newest max_turns // 2 messages into the summary."""
+        old = conversation.turns[:len(conversation.turns) - self.max_turns // 2]
+        try:
+            if self.summarise is None:
+                raise RuntimeError("no summariser configured")
+            summary = await self.summarise(conversation.summary, old)
+        except Exception as e:
+            self.summary_errors += 1
+            print(f"Summarising a conversation failed, keeping shortened messages: {getattr(e, 'detail', e)}")
+            summary = fallback_summary(conversation.summary, old)
+        # Messages are only ever appended, so the folded ones are still at the front
+        conversation.summary = summary
+        del conversation.turns[:len(old)]
+        conversation.compacting = False
+        self.compactions += 1
+
+    def reset(self, user_id: int) -> bool:
+        return self._conversations.pop(user_id, None) is not None
+
+    async def aclose(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "conversations": len(self._conversations),
+            "max_users": self.max_users,
+            "stats_fetches": self.stats_fetches,
+            "stats_errors": self.stats_errors,
+            "compactions": self.compactions,
+            "summary_errors": self.summary_errors,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,151 @@
+"""
+Precomputed answers for when Gemini is unavailable.
+
+The quest library is built once at import; picking quests for a profile is a
+few dict lookups, so degraded mode answers immediately. Quests follow the
+user's fitness level, goals, equipment and recent step count; chat replies
+follow the context stats.
+"""
+
+from response_cache import bucket_value
+
+# fitness_level -> quest difficulty, and points per difficulty
+LEVEL_DIFFICULTY = {"beginner": "easy", "intermediate": "medium", "advanced": "hard", "expert": "expert"}
+DIFFICULTY_POINTS = {"easy": 30, "medium": 60, "hard": 100, "expert": 150}
+# How much harder each difficulty makes a quest's target
+DIFFICULTY_SCALE = {"easy": 1.0, "medium": 1.5, "hard": 2.0, "expert": 3.0}
+
+# goal keyword -> categories worth suggesting first
+GOAL_CATEGORIES = [
+    ("weight", ["cardio", "hybrid"]),
+    ("muscle", ["strength"]),
+    ("strength", ["strength"]),
+    ("endurance", ["cardio"]),
+    ("cardio", ["cardio"]),
+    ("flexib", ["flexibility"]),
+    ("stress", ["mindfulness"]),
+    ("sleep", ["mindfulness"]),
+    ("mind", ["mindfulness"]),
+]
+DEFAULT_CATEGORIES = ["cardio", "strength", "flexibility", "mindfulness", "hybrid"]
+
+# Base quests per category; target_value is for "easy" and scaled by difficulty.
+# "equipment" quests are preferred when the user has that equipment.
+QUEST_TEMPLATES = {
+    "cardio": [
+        {"title": "Step It Up", "description": "Hit your daily step target every day this week",
+         "target_value": 7000, "target_unit": "steps", "duration_days": 7,
+         "motivational_message": "Every step counts! Let's get moving! 🚶"},
+        {"title": "Cardio Sessions", "description": "Fit in brisk walks, runs or rides of 20 minutes or more",
+         "target_value": 3, "target_unit": "sessions", "duration_days": 7,
+         "motivational_message": "Get that heart pumping! ❤️"},
+    ],
+    "strength": [
+        {"title": "Dumbbell Builder", "description": "Complete full-body dumbbell workouts this week",
+         "target_value": 2, "target_unit": "sessions", "duration_days": 7, "equipment": "dumbbells",
+         "motivational_message": "Build that strength! 💪"},
+        {"title": "Bodyweight Basics", "description": "Do squats, push-ups and lunges in sets through the week",
+         "target_value": 100, "target_unit": "reps", "duration_days": 7,
+         "motivational_message": "You're stronger than you think! 💪"},
+    ],
+    "flexibility": [
+        {"title": "Mat Stretch Flow", "description": "Follow a 10-minute stretching flow on your mat",
+         "target_value": 4, "target_unit": "sessions", "duration_days": 7, "equipment": "yoga_mat",
+         "motivational_message": "Flexibility is fitness too! 🧘"},
+        {"title": "Daily Stretch", "description": "Stretch for a few minutes every day",
+         "target_value": 30, "target_unit": "minutes", "duration_days": 7,
+         "motivational_message": "Loosen up and feel great! 🌿"},
+    ],
+    "mindfulness": [
+        {"title": "Calm Minutes", "description": "Take quiet breathing or meditation breaks",
+         "target_value": 20, "target_unit": "minutes", "duration_days": 7,
+         "motivational_message": "A calm mind powers a strong body 🧠"},
+        {"title": "Hydration Hero", "description": "Drink 8 glasses of water on as many days as you can",
+         "target_value": 5, "target_unit": "days", "duration_days": 7,
+         "motivational_message": "Stay hydrated, stay healthy! 💧"},
+    ],
+    "hybrid": [
+        {"title": "Active Mix", "description": "Combine a walk and a short strength circuit in one session",
+         "target_value": 3, "target_unit": "sessions", "duration_days": 7,
+         "motivational_message": "Mix it up and keep it fun! 🔥"},
+    ],
+}
+
+
+def _quest(template: dict, category: str, difficulty: str) -> dict:
+    quest = {key: value for key, value in template.items() if key != "equipment"}
+    quest.update(
+        category=category,
+        difficulty=difficulty,
+        target_value=int(round(template["target_value"] * DIFFICULTY_SCALE[difficulty])),
+        points=DIFFICULTY_POINTS[difficulty],
+    )
+    return quest
+
+
+# (category, difficulty) -> quests ready to serve, equipment-specific ones first
+QUEST_LIBRARY = {
+    (category, difficulty): [
+        (template.get("equipment"), _quest(template, category, difficulty))
+        for template in sorted(templates, key=lambda t: "equipment" not in t)
+    ]
+    for category, templates in QUEST_TEMPLATES.items()
+    for difficulty in DIFFICULTY_SCALE
+}
+
+
+def fallback_quests(user_info, num_quests: int) -> list[dict]:
+    """Quests for a UserInfo from the library: one per matching category, then any others."""
+    difficulty = LEVEL_DIFFICULTY.get(user_info.fitness_level.strip().lower(), "easy")
+    categories = []
+    for goal in user_info.goals:
+        for keyword, matches in GOAL_CATEGORIES:
+            if keyword in goal.lower():
+                categories += [c for c in matches if c not in categories]
+    categories += [c for c in DEFAULT_CATEGORIES if c not in categories]
+    equipment = {item.lower() for item in user_info.equipment}
+
+    # Step goals start from the user's own average instead of a fixed number
+    steps = (user_info.health_stats or {}).get("average_steps")
+    quests = []
+    for category in categories:
+        for required, quest in QUEST_LIBRARY[(category, difficulty)]:
+            if required and required not in equipment:
+                continue
+            if quest["target_unit"] == "steps" and isinstance(steps, (int, float)):
+                quest = {**quest, "target_value": int(bucket_value("steps", steps)) + 1000}
+            quests.append(quest)
+            break
+        if len(quests) >= num_quests:
+            break
+    return quests
+
+
+FALLBACK_QUESTS_MESSAGE = (
+    "Coach Star is catching their breath, so here are some tried-and-true quests picked "
+    "for your level and goals. Fresh personalised quests are coming soon! 💪"
+)
+
+# (context key, threshold, reply when below, reply when at or above)
+CHAT_REPLIES = [
+    ("steps", 5000,
+     "Every step counts! A 10-minute walk right now is a great way to get going. 🚶",
+     "Great work on your steps today! Keep that momentum going. 🔥"),
+    ("active_minutes", 30,
+     "Try to squeeze in a few more active minutes today: even a short workout helps. 💪",
+     "You've been active today, awesome! Remember to stretch and recover. 🧘"),
+    ("completed_quests", 1,
+     "Pick one quest and take the first small step today. You've got this! 🎯",
+     "You're crushing your quests this week! Keep that streak alive. 🏆"),
+]
+DEFAULT_CHAT_REPLY = "Keep moving, stay hydrated, and be proud of every bit of progress. You've got this! 💪"
+CHAT_FALLBACK_NOTE = " (Coach Star is a little busy right now, so this is a quick tip. Ask again soon for a full answer!)"
+
+
+def fallback_chat_reply(context: dict | None) -> str:
+    """Short canned coaching tip chosen from the context stats."""
+    for key, threshold, below, above in CHAT_REPLIES:
+        value = (context or {}).get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return (below if value < threshold else above) + CHAT_FALLBACK_NOTE
+    return DEFAULT_CHAT_REPLY + CHAT_FALLBACK_NOTE
@@ -3,27 +3,42 @@ Gemini AI Fitness Trainer API
 Endpoints for chat and quest generation
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import google.generativeai as genai
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional, Dict, Any, Literal
+import asyncio
+import httpx
+import json
 import os
-from datetime import datetime
+import re
+import time
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from response_cache import ResponseCache, cache_key, normalise_context, normalise_text
+from conversations import ConversationStore, user_context
+from fallbacks import FALLBACK_QUESTS_MESSAGE, fallback_chat_reply, fallback_quests
+from resilience import CircuitOpenError, LLMGuard
+from llm_providers import make_provider
+from instrumentation import (
+    InstrumentationMiddleware, TimedJSONResponse, instrument_serialization, metrics, record, timed,
+)
+from prompts import (
+    CHAT_SYSTEM_INSTRUCTION, QUEST_SYSTEM_INSTRUCTION, SUMMARY_SYSTEM_INSTRUCTION, CHAT_SYSTEM_TOKENS,
+    QUEST_SYSTEM_TOKENS, build_chat_prompt, build_quest_prompt, build_summary_prompt, estimate_tokens,
+    prompt_report,
+)
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
-
-genai.configure(api_key=GEMINI_API_KEY)
+# LLM backend: "gemini" (needs GEMINI_API_KEY) or "local", an offline stand-in
+# for load tests (see llm_providers.py)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
 
 # Initialize FastAPI app
-app = FastAPI(title="StarLife AI Fitness Trainer", version="1.0.0")
+app = FastAPI(title="StarLife AI Fitness Trainer", version="1.0.0", default_response_class=TimedJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -34,45 +49,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# System prompts
-FITNESS_TRAINER_PROMPT = """You are an enthusiastic, motivating, and knowledgeable fitness trainer named Coach Natalia. 
-Your personality:
-- Energetic and positive, always encouraging users
-- Use motivational language and emojis appropriately
-- Personalize advice based on user's fitness level and goals
-- Be supportive but also challenge users to push their limits
-- Celebrate achievements, no matter how small
-- Provide practical, safe fitness advice
-- Keep responses concise but impactful (2-3 sentences usually)
-
-Your expertise:
-- Exercise routines and proper form
-- Nutrition basics and healthy eating
-- Goal setting and motivation
-- Progress tracking and accountability
-- Injury prevention and recovery
-
-Remember: You're not just giving information, you're being a supportive coach and cheerleader!"""
-
-QUEST_GENERATOR_PROMPT = """You are a creative fitness quest designer for the StarLife app.
-Your role is to create engaging, achievable fitness quests (challenges) based on:
-- User's current fitness level
-- Previous quest performance
-- User's goals and preferences
-- Progressive difficulty
-
-Quest Guidelines:
-- Make quests specific, measurable, achievable, relevant, and time-bound (SMART)
-- Include variety: cardio, strength, flexibility, mindfulness
-- Balance challenge with achievability
-- Consider user's available time and resources
-- Make quests engaging and fun, not just boring exercises
-
-Quest difficulty levels:
-- Easy: Suitable for beginners, low impact
-- Medium: Moderate intensity, requires some fitness
-- Hard: High intensity, for experienced users
-- Expert: Advanced challenges for fitness enthusiasts"""
+# Per-route latency and LLM/serialisation/Python time per request (GET /metrics)
+app.add_middleware(InstrumentationMiddleware)
+instrument_serialization()
 
 # Models
 class ChatRequest(BaseModel):
@@ -83,6 +62,9 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     timestamp: str
+    cached: Optional[str] = None  # "exact", "similar" or "shared" when served from the response cache
+    prompt_tokens: Optional[int] = None  # estimated, system instruction included
+    degraded: bool = False  # True when Gemini was unavailable and a canned answer was served
 
 class PreviousQuest(BaseModel):
     quest_name: str
@@ -105,228 +87,621 @@ class QuestGenerationRequest(BaseModel):
     previous_quests: Optional[List[PreviousQuest]] = []
     num_quests: int = 3  # Number of quests to generate
 
+QuestDifficulty = Literal["easy", "medium", "hard", "expert"]
+QuestCategory = Literal["cardio", "strength", "flexibility", "mindfulness", "hybrid"]
+
 class Quest(BaseModel):
     title: str
     description: str
-    difficulty: str
-    category: str  # cardio, strength, flexibility, mindfulness, hybrid
+    difficulty: QuestDifficulty
+    category: QuestCategory
     target_value: int  # target steps, reps, minutes, etc.
     target_unit: str  # steps, reps, minutes, sessions
     duration_days: int  # how many days to complete
     points: int  # reward points
     motivational_message: str
 
+class QuestBatch(BaseModel):
+    """Structured output requested from Gemini for quest generation"""
+    quests: List[Quest]
+    personalized_message: str
+
 class QuestGenerationResponse(BaseModel):
     quests: List[Quest]
     personalized_message: str
     timestamp: str
+    cached: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    degraded: bool = False
+
+# Embedding model for the response cache's similarity matching
+RESPONSE_CACHE_EMBED_MODEL = os.getenv("RESPONSE_CACHE_EMBED_MODEL", "models/text-embedding-004")
+
+# Initialize models; the static prompts go in once as system instructions
+llm_provider = make_provider(LLM_PROVIDER, RESPONSE_CACHE_EMBED_MODEL)
+chat_model = llm_provider.model('gemini-2.0-flash', system_instruction=CHAT_SYSTEM_INSTRUCTION)
+# Quest answers are JSON constrained to the QuestBatch schema
+quest_model = llm_provider.model(
+    'gemini-2.0-flash', system_instruction=QUEST_SYSTEM_INSTRUCTION, response_schema=QuestBatch
+)
+summary_model = llm_provider.model('gemini-2.0-flash', system_instruction=SUMMARY_SYSTEM_INSTRUCTION)
+
+# LLM call limits: calls in flight per worker, seconds a call may wait for a free
+# slot, and seconds a single Gemini call may take
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+# Circuit breaker and adaptive timeout per model: failed calls in a row that open
+# the breaker, seconds it stays open before a probe call, the shortest timeout, and
+# the multiple of the observed p95 latency a call may take (LLM_TIMEOUT_SECONDS
+# stays the upper bound)
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+LLM_MIN_TIMEOUT_SECONDS = float(os.getenv("LLM_MIN_TIMEOUT_SECONDS", "5"))
+LLM_TIMEOUT_P95_MULTIPLIER = float(os.getenv("LLM_TIMEOUT_P95_MULTIPLIER", "2"))
+# Hedged calls: a second call starts once a call runs past this latency quantile
+# (0 = off, e.g. 0.95), for at most this share of calls
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0"))
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+
+def make_guard(name: str) -> LLMGuard:
+    return LLMGuard(
+        name, LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS, LLM_MIN_TIMEOUT_SECONDS,
+        LLM_TIMEOUT_SECONDS, LLM_TIMEOUT_P95_MULTIPLIER, LLM_HEDGE_QUANTILE, LLM_HEDGE_MAX_RATIO,
+    )
+
+chat_guard = make_guard("chat")
+quest_guard = make_guard("quests")
+
+llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+llm_stats = {"in_flight": 0, "rejected": 0, "timed_out": 0, "cancelled": 0}
+# Tokens billed since startup, from the usage metadata of each answer
+llm_usage = {"prompt_tokens": 0, "completion_tokens": 0}
+
+# Response cache: answers kept (0 disables the cache), seconds an answer is reused,
+# and the cosine similarity above which a differently worded chat message reuses
+# an answer (0 = exact matches only; similarity matching embeds every new message
+# with RESPONSE_CACHE_EMBED_MODEL)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+async def embed_text(text: str) -> List[float]:
+    with timed("embed"):
+        return await asyncio.wait_for(llm_provider.embed(text), timeout=LLM_TIMEOUT_SECONDS)
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_SIMILARITY, embed_text)
+
+# Conversation memory: users kept (0 = stateless chat), messages kept verbatim
+# before the older half is summarised, seconds of inactivity before a
+# conversation starts over, and seconds before a user's stats snapshot is
+# refreshed from the backend
+CONVERSATION_MAX_USERS = int(os.getenv("CONVERSATION_MAX_USERS", "10000"))
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "12"))
+CONVERSATION_IDLE_SECONDS = float(os.getenv("CONVERSATION_IDLE_SECONDS", "86400"))
+CONVERSATION_STATS_TTL_SECONDS = float(os.getenv("CONVERSATION_STATS_TTL_SECONDS", "300"))
+BACKEND_SERVICE_URL = os.getenv("BACKEND_SERVICE_URL", "http://localhost:8000")
+
+backend_client = httpx.AsyncClient(base_url=BACKEND_SERVICE_URL, timeout=5.0)
+
+async def fetch_user_stats(user_id: int) -> dict:
+    """Chat context for a user from the StarLife backend"""
+    with timed("backend"):
+        health, quests = await asyncio.gather(
+            # Only the latest day is used; a week keeps the response small however long the history
+            backend_client.get(f"/journey/{user_id}", params={
+                "series": "health",
+                "health_metrics": "steps,workout_minutes",
+                "resolution": "day",
+                "from": (datetime.now().date() - timedelta(days=7)).isoformat(),
+            }),
+            backend_client.get(f"/quests/{user_id}"),
+        )
+    health.raise_for_status()
+    quests.raise_for_status()
+    return user_context(health.json()["health"], quests.json())
+
+async def summarise_conversation(summary: Optional[str], turns: list) -> str:
+    return await generate_text(summary_model, build_summary_prompt(summary, turns), guard=chat_guard)
+
+conversations = ConversationStore(
+    CONVERSATION_MAX_USERS, CONVERSATION_MAX_TURNS, CONVERSATION_IDLE_SECONDS,
+    CONVERSATION_STATS_TTL_SECONDS, fetch_user_stats, summarise_conversation,
+)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await conversations.aclose()
+    await backend_client.aclose()
+
+async def wait_for_disconnect(http_request: Request, poll_interval: float = 0.5):
+    """Returns once the client has gone away."""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(poll_interval)
+
+def usage_info(response) -> Optional[Dict[str, int]]:
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return None
+    return {
+        "prompt_tokens": usage.prompt_token_count,
+        "completion_tokens": usage.candidates_token_count,
+        "total_tokens": usage.total_token_count,
+    }
+
+def record_usage(usage: Optional[Dict[str, int]]):
+    if usage:
+        llm_usage["prompt_tokens"] += usage["prompt_tokens"] or 0
+        llm_usage["completion_tokens"] += usage["completion_tokens"] or 0
+
+async def acquire_llm_slot():
+    """Waits up to LLM_QUEUE_TIMEOUT_SECONDS for a free call slot, else raises 503."""
+    try:
+        await asyncio.wait_for(llm_slots.acquire(), timeout=LLM_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        llm_stats["rejected"] += 1
+        raise HTTPException(status_code=503, detail="AI trainer is busy, please try again shortly",
+                            headers={"Retry-After": "5"})
+    llm_stats["in_flight"] += 1
+
+def release_llm_slot():
+    llm_stats["in_flight"] -= 1
+    llm_slots.release()
+
+async def hedge_call(model, prompt: str):
+    """A hedged duplicate of a call; it only runs on a free slot and never queues."""
+    if llm_slots.locked():
+        raise RuntimeError("no free call slot for a hedged call")
+    await acquire_llm_slot()
+    try:
+        return await model.generate_content_async(prompt)
+    finally:
+        release_llm_slot()
+
+async def generate_text(model, prompt: str, http_request: Optional[Request] = None,
+                        guard: Optional[LLMGuard] = None) -> str:
+    """
+    Runs one model call on the event loop without blocking it.
+    At most LLM_MAX_CONCURRENCY calls run at once; each is cut off after
+    LLM_TIMEOUT_SECONDS (or the guard's adaptive timeout) and cancelled early
+    if the client disconnects. With a guard, CircuitOpenError is raised
+    without queueing while its breaker is open.
+    """
+    if guard is not None:
+        guard.admit()
+    try:
+        with timed("llm_queue"):
+            await acquire_llm_slot()
+    except HTTPException:
+        if guard is not None:
+            guard.abandon()
+        raise
+    try:
+        if guard is None:
+            timeout = LLM_TIMEOUT_SECONDS
+            attempt = asyncio.wait_for(model.generate_content_async(prompt), timeout=timeout)
+        else:
+            timeout = guard.timeout()
+            attempt = guard.call(
+                lambda: model.generate_content_async(prompt), lambda: hedge_call(model, prompt), timeout
+            )
+        with timed("llm"):
+            call = asyncio.create_task(attempt)
+            if http_request is not None:
+                watcher = asyncio.create_task(wait_for_disconnect(http_request))
+                try:
+                    await asyncio.wait({call, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    watcher.cancel()
+                if not call.done():
+                    call.cancel()
+                    llm_stats["cancelled"] += 1
+                    # Nobody is left to read the response; 499 only shows up in logs
+                    raise HTTPException(status_code=499, detail="Client closed request")
+
+            try:
+                response = await call
+            except asyncio.TimeoutError:
+                llm_stats["timed_out"] += 1
+                raise HTTPException(status_code=504, detail=f"AI response timed out after {timeout:g}s")
+    finally:
+        release_llm_slot()
+
+    record_usage(usage_info(response))
+    if not response or not response.text:
+        raise HTTPException(status_code=500, detail="Failed to generate response")
+    return response.text
+
+def use_fallback(error: Exception, guard: LLMGuard) -> bool:
+    """
+    Whether a failed model call is answered from fallbacks: yes for an open
+    breaker and upstream failures, no for a busy trainer (503) or a client
+    that went away (499).
+    """
+    if isinstance(error, HTTPException) and error.status_code not in (500, 504):
+        return False
+    guard.fallbacks += 1
+    print(f"Serving a fallback answer ({guard.name}): {getattr(error, 'detail', error)}")
+    return True
 
-# Initialize Gemini models
-chat_model = genai.GenerativeModel('gemini-2.0-flash')
-quest_model = genai.GenerativeModel('gemini-2.0-flash')
+metrics.register_gauges("llm", lambda: {**llm_stats, **llm_usage})
+metrics.register_gauges("llm_guard", lambda: {"chat": chat_guard.stats(), "quests": quest_guard.stats()}, label="guard")
+metrics.register_gauges("response_cache", response_cache.stats)
+metrics.register_gauges("conversations", conversations.stats)
 
 # Health check
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "StarLife AI Trainer"}
+    return {
+        "status": "healthy",
+        "service": "StarLife AI Trainer",
+        "llm": {"provider": LLM_PROVIDER, **llm_stats, **llm_usage, "max_concurrency": LLM_MAX_CONCURRENCY},
+        "response_cache": response_cache.stats(),
+        "quest_parsing": quest_parse_stats,
+        "prompts": prompt_report(),
+        "conversations": conversations.stats(),
+        "resilience": {"chat": chat_guard.stats(), "quests": quest_guard.stats()},
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: per-route latency, time per phase (llm, llm_queue, embed, backend, serialize, python) and LLM gauges"""
+    return metrics.render()
+
+def chat_cache_keys(message: str, context: Optional[Dict[str, Any]], history: Optional[Dict[str, Any]]):
+    """
+    (key, group, text) for the response cache; user_id is left out on purpose.
+    Mid-conversation answers depend on the history, so it is part of the key.
+    """
+    context = normalise_context(context)
+    text = normalise_text(message)
+    scope = ("chat",) + ((history,) if history else ())
+    return cache_key(*scope, text, context), cache_key(*scope, context), text
 
 # Chat endpoint
 @app.post("/chat", response_model=ChatResponse)
-async def chat_with_trainer(request: ChatRequest):
+async def chat_with_trainer(request: ChatRequest, http_request: Request = None):
     """
     Chat with AI fitness trainer
     Provides motivation, advice, and personalized fitness guidance
     """
     try:
-        # Build context for the AI
-        context_info = ""
-        if request.context:
-            context_info = f"\n\nUser context:\n"
-            if "steps" in request.context:
-                context_info += f"- Recent steps: {request.context['steps']}\n"
-            if "heart_rate" in request.context:
-                context_info += f"- Heart rate: {request.context['heart_rate']} bpm\n"
-            if "active_minutes" in request.context:
-                context_info += f"- Active minutes today: {request.context['active_minutes']}\n"
-            if "completed_quests" in request.context:
-                context_info += f"- Completed quests this week: {request.context['completed_quests']}\n"
-        
-        # Create prompt
-        full_prompt = f"""{FITNESS_TRAINER_PROMPT}
-        {context_info}
-        
-User message: {request.message}
-
-Respond as Coach Star, their personal fitness trainer. Be encouraging, specific, and actionable."""
-
-        # Generate response
-        response = chat_model.generate_content(full_prompt)
-        
-        if not response or not response.text:
-            raise HTTPException(status_code=500, detail="Failed to generate response")
+        # Stats and earlier messages come from the conversation store
+        context = await conversations.context(request.user_id, request.context)
+        history = conversations.history(request.user_id)
+        full_prompt = build_chat_prompt(request.message, context, history)
+        key, group, text = chat_cache_keys(request.message, context, history)
+
+        # Generate response (or reuse the answer to an equivalent message)
+        try:
+            response_text, cached = await response_cache.get_or_create(
+                key, lambda: generate_text(chat_model, full_prompt, http_request, chat_guard), group, text
+            )
+        except Exception as e:
+            if not use_fallback(e, chat_guard):
+                raise
+            return ChatResponse(
+                response=fallback_chat_reply(normalise_context(context)),
+                timestamp=datetime.now().isoformat(),
+                degraded=True
+            )
+        conversations.add_exchange(request.user_id, request.message, response_text)
         
         return ChatResponse(
-            response=response.text,
-            timestamp=datetime.now().isoformat()
+            response=response_text,
+            timestamp=datetime.now().isoformat(),
+            cached=cached,
+            prompt_tokens=CHAT_SYSTEM_TOKENS + estimate_tokens(full_prompt)
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+def format_frame(event: str, data: dict, sse: bool) -> str:
+    """One stream frame: an SSE event, or an NDJSON line with the event name under "type"."""
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"type": event, **data}) + "\n"
+
+def chunk_text(chunk) -> str:
+    # .text raises on chunks without parts, e.g. the last one when a safety filter stops the answer
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+async def stream_chat(prompt: str, sse: bool, on_complete=None):
+    """
+    Frames for /chat/stream: "start" once a call slot is free, one "delta" per
+    model chunk, then "done" (or "error" if the model fails or stalls for
+    the chat guard's timeout before the first or between chunks).
+    on_complete(text, seconds) is called with the full answer before "done".
+    Raises CircuitOpenError before "start" while the chat breaker is open.
+    """
+    chat_guard.admit()
+    try:
+        with timed("llm_queue"):
+            await acquire_llm_slot()
+    except HTTPException:
+        chat_guard.abandon()
+        raise
+    chat_guard.calls += 1
+    timeout = chat_guard.timeout()
+    started = time.monotonic()
+    first_token_ms = None
+    usage = None
+    parts = []
+    finished = False
+    try:
+        yield format_frame("start", {}, sse)
+        try:
+            response = await asyncio.wait_for(
+                chat_model.generate_content_async(prompt, stream=True), timeout=timeout
+            )
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    break
+                usage = usage_info(chunk) or usage
+                text = chunk_text(chunk)
+                if not text:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = round((time.monotonic() - started) * 1000)
+                parts.append(text)
+                yield format_frame("delta", {"text": text}, sse)
+        except asyncio.TimeoutError:
+            llm_stats["timed_out"] += 1
+            chat_guard.record_failure(timed_out=True)
+            finished = True
+            yield format_frame("error", {"status": 504, "detail": f"AI response timed out after {timeout:g}s"}, sse)
+            return
+        except Exception as e:
+            chat_guard.record_failure()
+            finished = True
+            yield format_frame("error", {"status": 500, "detail": f"Error: {str(e)}"}, sse)
+            return
+
+        finished = True
+        chat_guard.record_success(time.monotonic() - started)
+        record_usage(usage)
+        if on_complete is not None and parts:
+            on_complete("".join(parts), time.monotonic() - started)
+        yield format_frame("done", {
+            "timestamp": datetime.now().isoformat(),
+            "usage": usage,
+            "time_to_first_token_ms": first_token_ms,
+            "duration_ms": round((time.monotonic() - started) * 1000),
+        }, sse)
+    finally:
+        if not finished:
+            # Client went away mid-answer; closing the generator abandons the model stream
+            llm_stats["cancelled"] += 1
+            chat_guard.abandon()
+        release_llm_slot()
+        record("llm", time.monotonic() - started)
+
+async def stream_cached(text: str, cached: Optional[str], sse: bool, degraded: bool = False):
+    """/chat/stream frames for an answer from the response cache, or a fallback."""
+    yield format_frame("start", {}, sse)
+    yield format_frame("delta", {"text": text}, sse)
+    yield format_frame("done", {
+        "timestamp": datetime.now().isoformat(),
+        "usage": None,
+        "time_to_first_token_ms": 0,
+        "duration_ms": 0,
+        "cached": cached,
+        **({"degraded": True} if degraded else {}),
+    }, sse)
+
+# Streaming chat endpoint
+@app.post("/chat/stream")
+async def chat_with_trainer_stream(request: ChatRequest, http_request: Request):
+    """
+    Chat with AI fitness trainer, streaming the answer as the model writes it.
+    Sends Server-Sent Events when the client accepts text/event-stream,
+    otherwise newline-delimited JSON.
+    """
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    context = await conversations.context(request.user_id, request.context)
+    history = conversations.history(request.user_id)
+    key, group, text = chat_cache_keys(request.message, context, history)
+    cached_text, cached, embedding = await response_cache.lookup(key, group, text)
+    if cached is not None:
+        conversations.add_exchange(request.user_id, request.message, cached_text)
+        frames = stream_cached(cached_text, cached, sse)
+    else:
+        def store(answer: str, seconds: float):
+            response_cache.store(key, answer, group, embedding, seconds)
+            conversations.add_exchange(request.user_id, request.message, answer)
+
+        frames = stream_chat(build_chat_prompt(request.message, context, history), sse, on_complete=store)
+    # Wait for a call slot before answering, so a busy trainer still gets a plain 503
+    try:
+        start = await frames.__anext__()
+    except CircuitOpenError as e:
+        use_fallback(e, chat_guard)
+        frames = stream_cached(fallback_chat_reply(normalise_context(context)), None, sse, degraded=True)
+        start = await frames.__anext__()
+
+    async def body():
+        yield start
+        async for frame in frames:
+            yield frame
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.delete("/conversations/{user_id}")
+async def reset_conversation(user_id: int):
+    """Forget a user's chat history and stats snapshot"""
+    return {"reset": conversations.reset(user_id)}
+
 # Quest generation endpoint
 @app.post("/generate-quests", response_model=QuestGenerationResponse)
-async def generate_quests(request: QuestGenerationRequest):
+async def generate_quests(request: QuestGenerationRequest, http_request: Request = None):
     """
     Generate personalized fitness quests based on user info and history
     """
     try:
-        user_info = request.user_info
-        previous_quests = request.previous_quests or []
-        
-        # Build user profile for AI
-        user_profile = f"""
-User Profile:
-- User ID: {user_info.user_id}
-- Age: {user_info.age or 'Not specified'}
-- Fitness Level: {user_info.fitness_level}
-- Goals: {', '.join(user_info.goals)}
-- Available Time: {user_info.available_time or 'Not specified'} minutes/day
-- Equipment: {', '.join(user_info.equipment) if user_info.equipment else 'None'}
-"""
-        
-        if user_info.health_stats:
-            user_profile += f"\nRecent Health Stats:\n"
-            for key, value in user_info.health_stats.items():
-                user_profile += f"- {key}: {value}\n"
-        
-        # Build previous quest history
-        quest_history = ""
-        if previous_quests:
-            quest_history = "\n\nPrevious Quest Performance:\n"
-            for quest in previous_quests:
-                status = "✅ Completed" if quest.completed else f"⏸️ {quest.completion_percentage}% completed"
-                quest_history += f"- {quest.quest_name} ({quest.difficulty}): {status}\n"
-                if quest.notes:
-                    quest_history += f"  Notes: {quest.notes}\n"
-        
-        # Create quest generation prompt
-        quest_prompt = f"""{QUEST_GENERATOR_PROMPT}
-
-{user_profile}
-{quest_history}
-
-Generate {request.num_quests} personalized fitness quests for this user.
-
-For EACH quest, provide the following in a structured format:
-1. Title: (catchy, motivating title)
-2. Description: (clear explanation of what to do)
-3. Difficulty: (easy/medium/hard/expert based on user level)
-4. Category: (cardio/strength/flexibility/mindfulness/hybrid)
-5. Target Value: (specific number)
-6. Target Unit: (steps/reps/minutes/sessions/etc)
-7. Duration Days: (how many days to complete, typically 1-7)
-8. Points: (reward points: easy=10-30, medium=40-70, hard=80-120, expert=130-200)
-9. Motivational Message: (encouraging message for this specific quest)
-
-Also include a personalized message for the user about their progress and these new quests.
-
-Format your response EXACTLY like this:
-QUEST 1:
-Title: [title]
-Description: [description]
-Difficulty: [difficulty]
-Category: [category]
-Target Value: [number]
-Target Unit: [unit]
-Duration Days: [days]
-Points: [points]
-Motivational Message: [message]
-
-QUEST 2:
-[same format]
-
-...
-
-PERSONALIZED MESSAGE:
-[Your encouraging message to the user about their progress and new quests]
-"""
-
-        # Generate quests
-        response = quest_model.generate_content(quest_prompt)
-        
-        if not response or not response.text:
-            raise HTTPException(status_code=500, detail="Failed to generate quests")
-        
-        # Parse response
-        quests = parse_quest_response(response.text)
-        personalized_msg = extract_personalized_message(response.text)
-        
-        if not quests:
-            raise HTTPException(status_code=500, detail="Failed to parse quest response")
+        quest_prompt = build_quest_prompt(request)
+
+        # Generate quests (or reuse the answer for an equivalent profile)
+        degraded = False
+        try:
+            batch, cached = await generate_quest_batch(quest_prompt, http_request)
+            quests, personalized_msg = batch.quests, batch.personalized_message
+        except QuestParseError as e:
+            print(f"Error parsing quest response: {e}")
+            quests, personalized_msg, cached = profile_quests(request), DEFAULT_PERSONALIZED_MESSAGE, None
+        except Exception as e:
+            if not use_fallback(e, quest_guard):
+                raise
+            quests, personalized_msg, cached, degraded = profile_quests(request), FALLBACK_QUESTS_MESSAGE, None, True
         
         return QuestGenerationResponse(
             quests=quests,
             personalized_message=personalized_msg,
-            timestamp=datetime.now().isoformat()
+            timestamp=datetime.now().isoformat(),
+            cached=cached,
+            prompt_tokens=QUEST_SYSTEM_TOKENS + estimate_tokens(quest_prompt),
+            degraded=degraded
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
-def parse_quest_response(response_text: str) -> List[Quest]:
-    """Parse the AI response into Quest objects"""
-    quests = []
-    
+DEFAULT_PERSONALIZED_MESSAGE = "Great job on your fitness journey! These new quests are designed just for you. Let's crush them together! 💪🔥"
+
+# Quest answers by outcome: valid as returned, salvaged by the repair pass, or unusable
+quest_parse_stats = {"parsed": 0, "repaired": 0, "failed": 0, "quests_dropped": 0}
+
+# Filled in by the repair pass when Gemini leaves a field out
+QUEST_FIELD_DEFAULTS = {
+    "difficulty": "medium",
+    "category": "hybrid",
+    "target_value": 1,
+    "target_unit": "sessions",
+    "duration_days": 7,
+    "points": 50,
+    "motivational_message": "You got this! 💪",
+}
+QUEST_INT_FIELDS = ("target_value", "duration_days", "points")
+
+class QuestParseError(ValueError):
+    """No usable quest could be recovered from a quest generation answer."""
+
+def parse_quest_response(response_text: str) -> QuestBatch:
+    """
+    Parses Gemini's JSON quest answer. The common case is one validation pass
+    against QuestBatch; otherwise repair_quest_response keeps whatever quests
+    are usable. Raises QuestParseError when none are.
+    """
     try:
-        # Split by QUEST markers
-        quest_blocks = response_text.split("QUEST ")[1:]  # Skip first empty split
-        
-        for block in quest_blocks:
-            if "PERSONALIZED MESSAGE" in block:
-                block = block.split("PERSONALIZED MESSAGE")[0]
-            
-            lines = block.strip().split('\n')
-            quest_data = {}
-            
-            for line in lines:
-                line = line.strip()
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.strip().lower().replace(' ', '_')
-                    value = value.strip()
-                    quest_data[key] = value
-            
-            if 'title' in quest_data and 'description' in quest_data:
-                quest = Quest(
-                    title=quest_data.get('title', 'Fitness Challenge'),
-                    description=quest_data.get('description', ''),
-                    difficulty=quest_data.get('difficulty', 'medium').lower(),
-                    category=quest_data.get('category', 'hybrid').lower(),
-                    target_value=int(quest_data.get('target_value', 1)),
-                    target_unit=quest_data.get('target_unit', 'sessions'),
-                    duration_days=int(quest_data.get('duration_days', 7)),
-                    points=int(quest_data.get('points', 50)),
-                    motivational_message=quest_data.get('motivational_message', 'You got this! 💪')
-                )
-                quests.append(quest)
-        
-    except Exception as e:
-        print(f"Error parsing quest response: {e}")
-        # Return default quests if parsing fails
-        quests = get_default_quests()
-    
-    return quests
-
-def extract_personalized_message(response_text: str) -> str:
-    """Extract personalized message from AI response"""
+        batch = QuestBatch.model_validate_json(response_text)
+        quest_parse_stats["parsed"] += 1
+        return batch
+    except ValidationError:
+        pass
+
+    batch, dropped = repair_quest_response(response_text)
+    quest_parse_stats["quests_dropped"] += dropped
+    if not batch.quests:
+        quest_parse_stats["failed"] += 1
+        raise QuestParseError(f"no usable quest in the response ({dropped} dropped)")
+    quest_parse_stats["repaired"] += 1
+    return batch
+
+def repair_quest_response(response_text: str):
+    """
+    Salvages a malformed answer: strips code fences and surrounding text, reads
+    complete quest objects from truncated JSON, normalises field names, numbers
+    ("10,000") and enum casing, and drops quests that still don't validate.
+    Returns (QuestBatch, number of quests dropped).
+    """
+    text = re.sub(r"^```(?:json)?|```$", "", response_text.strip()).strip()
+    decoder = json.JSONDecoder()
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
     try:
-        if "PERSONALIZED MESSAGE:" in response_text:
-            msg = response_text.split("PERSONALIZED MESSAGE:")[1].strip()
-            return msg
-        else:
-            return "Great job on your fitness journey! These new quests are designed just for you. Let's crush them together! 💪🔥"
-    except:
-        return "Keep up the great work! Your new quests are ready. Let's make progress together! 🌟"
+        data, _ = decoder.raw_decode(text, start) if start >= 0 else (None, 0)
+    except json.JSONDecodeError:
+        data = None
+    if isinstance(data, list):
+        data = {"quests": data}
+
+    if isinstance(data, dict):
+        raw_quests = data.get("quests") or []
+        message = data.get("personalized_message")
+    else:
+        # Truncated or broken JSON: keep every complete object in the quests array
+        raw_quests, message = [], None
+        match = re.search(r'"quests"\s*:\s*\[', text)
+        pos = match.end() if match else len(text)
+        while pos < len(text):
+            while pos < len(text) and text[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(text) or text[pos] != "{":
+                break
+            try:
+                raw_quest, pos = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                break
+            raw_quests.append(raw_quest)
+
+    quests = []
+    for raw_quest in raw_quests if isinstance(raw_quests, list) else []:
+        if not isinstance(raw_quest, dict):
+            continue
+        fields = {str(k).strip().lower().replace(" ", "_"): v for k, v in raw_quest.items()}
+        for key, default in QUEST_FIELD_DEFAULTS.items():
+            if fields.get(key) in (None, ""):
+                fields[key] = default
+        for key in QUEST_INT_FIELDS:
+            if isinstance(fields[key], str):
+                digits = re.sub(r"[^0-9]", "", fields[key].split(".")[0])
+                fields[key] = int(digits) if digits else QUEST_FIELD_DEFAULTS[key]
+            elif isinstance(fields[key], float):
+                fields[key] = round(fields[key])
+        for key in ("difficulty", "category"):
+            fields[key] = str(fields[key]).strip().lower()
+        if fields["difficulty"] not in QuestDifficulty.__args__:
+            fields["difficulty"] = QUEST_FIELD_DEFAULTS["difficulty"]
+        if fields["category"] not in QuestCategory.__args__:
+            fields["category"] = QUEST_FIELD_DEFAULTS["category"]
+        try:
+            quests.append(Quest.model_validate(fields))
+        except ValidationError:
+            continue
+
+    dropped = len(raw_quests) - len(quests) if isinstance(raw_quests, list) else 0
+    if not isinstance(message, str) or not message.strip():
+        message = DEFAULT_PERSONALIZED_MESSAGE
+    return QuestBatch(quests=quests, personalized_message=message), dropped
+
+async def generate_quest_batch(quest_prompt: str, http_request: Optional[Request] = None):
+    """
+    (QuestBatch, cached) for a quest prompt. Only answers that parse are
+    cached; QuestParseError propagates so callers can fall back.
+    """
+    async def create():
+        return parse_quest_response(await generate_text(quest_model, quest_prompt, http_request, quest_guard))
+
+    return await response_cache.get_or_create(cache_key("quests", quest_prompt), create)
+
+def profile_quests(request: QuestGenerationRequest) -> List[Quest]:
+    """Precomputed quests matching the user's level, goals and equipment"""
+    quests = fallback_quests(request.user_info, request.num_quests)
+    return [Quest(**quest) for quest in quests] or get_default_quests()
 
 def get_default_quests() -> List[Quest]:
     """Fallback quests if AI generation fails"""
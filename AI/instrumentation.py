@@ -0,0 +1,238 @@
+"""
+Request metrics for the StarLife AI trainer.
+
+InstrumentationMiddleware times every request per route template and splits
+its time into phases that the code underneath records:
+
+    with timed("llm"):
+        response = await model.generate_content_async(prompt)
+
+Each phase adds its time and call count to the current request and to a
+per-phase call-duration histogram. Time not covered by any phase is reported
+as "python". Phases that overlap inside one request (asyncio.gather) are
+added up, so "python" is floored at 0.
+
+The metrics are prometheus_client collectors in their own registry;
+metrics.render() exports them for GET /metrics, together with any gauges
+registered with register_gauges().
+
+Streamed responses (/chat/stream) are timed until their headers are sent;
+phase time after that only reaches the per-call histograms.
+
+This is the backend's instrumentation.py without its slow-request profiler:
+time here is spent awaiting the model, which stack samples don't show.
+"""
+
+import re
+import time
+from contextvars import ContextVar
+
+import fastapi.routing
+import prometheus_client
+from fastapi.responses import JSONResponse
+from prometheus_client.core import GaugeMetricFamily
+
+# Seconds, for request and call durations
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Calls per request, e.g. LLM calls
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+# Response content types timed to their first byte (see InstrumentationMiddleware)
+STREAMING_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+
+class RequestTimings:
+    """Seconds and calls per phase for one request."""
+
+    __slots__ = ("seconds", "calls")
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+
+
+_current = ContextVar("request_timings", default=None)
+
+
+class StatsCollector:
+    """Collector turning registered stats dicts into gauges on every scrape."""
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.sources = []  # (name, collect, label)
+
+    def collect(self):
+        for name, collect, label in self.sources:
+            stats = collect()
+            families = {}
+            for group, group_stats in (stats.items() if label else [(None, stats)]):
+                for key, value in group_stats.items():
+                    if not isinstance(value, (int, float)):
+                        continue
+                    metric = re.sub(r"\W", "_", f"{self.namespace}_{name}_{key}")
+                    if metric not in families:
+                        families[metric] = GaugeMetricFamily(metric, f"{name} {key}", labels=[label] if label else None)
+                    families[metric].add_metric([str(group)] if label else [], float(value))
+            yield from families.values()
+
+
+class Metrics:
+    def __init__(self, namespace: str = "starlife"):
+        self.registry = prometheus_client.CollectorRegistry()
+        common = {"namespace": namespace, "registry": self.registry}
+        self.requests = prometheus_client.Counter(
+            "http_requests", "Requests by route template and status.", ["method", "route", "status"], **common)
+        self.in_flight = prometheus_client.Gauge("http_requests_in_flight", "Requests being served.", **common)
+        self.streams_open = prometheus_client.Gauge(
+            "http_streams_open", "Streamed responses (SSE, NDJSON) still sending.", **common)
+        self.durations = prometheus_client.Histogram(
+            "http_request_duration_seconds", "Request latency, to the last body byte (first byte for streams).",
+            ["method", "route"], buckets=LATENCY_BUCKETS, **common)
+        self.phase_seconds = prometheus_client.Counter(
+            "http_request_phase_seconds", "Request time per phase (llm, embed, serialize, ..., python).",
+            ["method", "route", "phase"], **common)
+        self.phase_calls = prometheus_client.Histogram(
+            "http_request_phase_calls", "Calls per request for requests making any, e.g. LLM calls.",
+            ["method", "route", "phase"], buckets=COUNT_BUCKETS, **common)
+        self.calls = prometheus_client.Histogram(
+            "phase_call_duration_seconds", "Duration of single calls, e.g. one LLM call.",
+            ["phase"], buckets=LATENCY_BUCKETS, **common)
+        self.stats = StatsCollector(namespace)
+        self.registry.register(self.stats)
+
+    def register_gauges(self, name: str, collect, label: str | None = None):
+        """
+        Exports the numbers in collect()'s dict as gauges named
+        <namespace>_<name>_<key>. With label, collect() returns
+        {label value: stats dict} instead.
+        """
+        self.stats.sources.append((name, collect, label))
+
+    def observe_request(self, method: str, route: str, status: int, timings: RequestTimings, seconds: float):
+        self.requests.labels(method, route, str(status)).inc()
+        self.durations.labels(method, route).observe(seconds)
+        covered = 0.0
+        for phase, phase_seconds in timings.seconds.items():
+            self.phase_seconds.labels(method, route, phase).inc(phase_seconds)
+            self.phase_calls.labels(method, route, phase).observe(timings.calls[phase])
+            covered += phase_seconds
+        self.phase_seconds.labels(method, route, "python").inc(max(seconds - covered, 0.0))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return prometheus_client.generate_latest(self.registry).decode()
+
+
+metrics = Metrics()
+
+
+def record(phase: str, seconds: float, calls: int = 1):
+    """
+    Adds finished calls to the phase's histogram and to the current request,
+    if any. calls=0 only adds time.
+    """
+    if calls:
+        metrics.calls.labels(phase).observe(seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings.seconds[phase] = timings.seconds.get(phase, 0.0) + seconds
+        timings.calls[phase] = timings.calls.get(phase, 0) + calls
+
+
+class timed:
+    """Context manager recording the time spent in its block in `phase` (see record)."""
+
+    __slots__ = ("phase", "calls", "started")
+
+    def __init__(self, phase: str, calls: int = 1):
+        self.phase = phase
+        self.calls = calls
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.phase, time.perf_counter() - self.started, self.calls)
+
+
+_serialize_response = fastapi.routing.serialize_response
+
+
+async def _timed_serialize_response(*args, **kwargs):
+    with timed("serialize"):
+        return await _serialize_response(*args, **kwargs)
+
+
+def instrument_serialization():
+    """
+    Times response_model validation and encoding as "serialize". FastAPI has
+    no hook for it, so this wraps fastapi.routing.serialize_response.
+    """
+    fastapi.routing.serialize_response = _timed_serialize_response
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse whose json.dumps is timed as "serialize"; use as default_response_class."""
+
+    def render(self, content) -> bytes:
+        with timed("serialize"):
+            return super().render(content)
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware recording every HTTP request in `metrics`. Streamed
+    responses are timed until their headers are sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.routes = None  # endpoint -> route template
+
+    def route(self, scope) -> str:
+        # The router stores the matched endpoint in the scope; templates keep label values bounded
+        endpoint = scope.get("endpoint")
+        if self.routes is None and "app" in scope:
+            self.routes = {getattr(route, "endpoint", None): route.path for route in scope["app"].routes}
+        return (self.routes or {}).get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        streaming = False
+        finished = False
+
+        def finish(seconds: float):
+            nonlocal finished
+            finished = True
+            metrics.in_flight.dec()
+            route = self.route(scope)
+            metrics.observe_request(scope["method"], route, status, timings, seconds)
+
+        async def send_with_status(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", ())).get(b"content-type", b"")
+                if content_type.startswith(STREAMING_TYPES):
+                    # A stream's duration is its client's session; record the time to its headers instead
+                    streaming = True
+                    metrics.streams_open.inc()
+                    finish(time.perf_counter() - started)
+            await send(message)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        metrics.in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            if streaming:
+                metrics.streams_open.dec()
+            if not finished:
+                finish(time.perf_counter() - started)
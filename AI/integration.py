@@ -1,70 +1,150 @@
 """
 Integration layer between AI Trainer and StarLife Backend
 This bridges the AI service with your PostgreSQL database
+
+AsyncAITrainerIntegration does the work on one pooled httpx.AsyncClient
+(keep-alive connections, timeouts, retries with jittered backoff) and fetches
+independent backend resources concurrently. AITrainerIntegration wraps it for
+synchronous callers.
 """
 
-import requests
-from typing import List, Dict, Any
+import asyncio
+import os
+import random
+import uuid
+from typing import List, Dict, Any, Optional
+
+import httpx
 
 # Service URLs
-AI_SERVICE_URL = "http://localhost:8001"
-BACKEND_SERVICE_URL = "http://localhost:8000"
+AI_SERVICE_URL = os.getenv("AI_SERVICE_URL", "http://localhost:8001")
+BACKEND_SERVICE_URL = os.getenv("BACKEND_SERVICE_URL", "http://localhost:8000")
 
-class AITrainerIntegration:
-    """Integration between AI Trainer and StarLife Backend"""
-    
-    def __init__(self, ai_url: str = AI_SERVICE_URL, backend_url: str = BACKEND_SERVICE_URL):
+# HTTP client settings: seconds per backend request, seconds per AI request (Gemini
+# calls can queue and take a while), attempts per request, base delay of the
+# exponential backoff between attempts, and pooled connections per client
+BACKEND_TIMEOUT_SECONDS = float(os.getenv("BACKEND_TIMEOUT_SECONDS", "10"))
+AI_TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", "60"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", "0.5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+
+# Worth another attempt: rate limited, or the service/proxy is briefly unavailable
+RETRY_STATUSES = {429, 502, 503, 504}
+MAX_BACKOFF_SECONDS = 10.0
+
+
+class AsyncAITrainerIntegration:
+    """Integration between AI Trainer and StarLife Backend, on a pooled async HTTP client"""
+
+    def __init__(self, ai_url: str = AI_SERVICE_URL, backend_url: str = BACKEND_SERVICE_URL,
+                 retries: int = HTTP_RETRIES, backoff: float = HTTP_BACKOFF_SECONDS,
+                 max_connections: int = HTTP_MAX_CONNECTIONS, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.ai_url = ai_url
         self.backend_url = backend_url
-    
-    def generate_and_save_quests(self, user_id: int) -> Dict[str, Any]:
+        self.retries = max(1, retries)  # attempts per request; HTTP_RETRIES=0 still sends once
+        self.backoff = backoff
+        # transport: e.g. httpx.ASGITransport(app) to run against in-process stand-ins
+        self.client = httpx.AsyncClient(
+            timeout=BACKEND_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        # Full jitter, so clients that failed together don't retry together
+        delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), MAX_BACKOFF_SECONDS))
+        return delay
+
+    async def request(self, method: str, url: str, idempotent: bool = True, **kwargs) -> httpx.Response:
+        """
+        Sends one request, retrying timeouts, connection errors and RETRY_STATUSES.
+        Non-idempotent requests are only retried when the connection failed
+        before anything was sent. Raises httpx.HTTPError once attempts run out.
+        """
+        for attempt in range(self.retries):
+            last_attempt = attempt == self.retries - 1
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if last_attempt:
+                    raise
+                response = None
+            except httpx.TransportError:
+                if last_attempt or not idempotent:
+                    raise
+                response = None
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt or not idempotent:
+                    return response
+            await asyncio.sleep(self._delay(attempt, response))
+
+    async def _get_json(self, url: str) -> Optional[Any]:
+        """JSON body of a 200 response, or None if the request failed."""
+        try:
+            response = await self.request("GET", url)
+        except httpx.HTTPError as e:
+            print(f"GET {url} failed: {e!r}")
+            return None
+        return response.json() if response.status_code == 200 else None
+
+    async def _fetch_user_data(self, user_id: int):
+        """User, quests and health metrics, fetched concurrently."""
+        return await asyncio.gather(
+            self._get_json(f"{self.backend_url}/user/{user_id}"),
+            self._get_json(f"{self.backend_url}/quests/{user_id}"),
+            self._get_json(f"{self.backend_url}/journey/health-metrics/{user_id}"),
+        )
+
+    async def generate_and_save_quests(self, user_id: int) -> Dict[str, Any]:
         """
         Generate personalized quests from AI and save them to database
-        
+
         Flow:
-        1. Get user info from backend
-        2. Get user's quest history from backend
-        3. Call AI to generate new quests
-        4. Save quests to backend database
-        5. Return results
+        1. Get user info, quest history and health stats from backend (concurrently)
+        2. Call AI to generate new quests
+        3. Save quests to backend database
+        4. Return results
         """
-        
-        # Step 1: Get user info from backend
-        user_response = requests.get(f"{self.backend_url}/users/{user_id}")
-        if user_response.status_code != 200:
+
+        # Step 1: Get user info, quest history and health stats
+        user_data, quests_data, health_data = await self._fetch_user_data(user_id)
+        if user_data is None:
             return {"error": "User not found"}
-        
-        user_data = user_response.json()
-        
-        # Step 2: Get user's quest history
-        quests_response = requests.get(f"{self.backend_url}/users/{user_id}/quests")
-        previous_quests = []
-        
-        if quests_response.status_code == 200:
-            quests_data = quests_response.json()
-            previous_quests = [
-                {
-                    "quest_name": q.get("quest_name", ""),
-                    "difficulty": q.get("difficulty", "medium"),
-                    "completed": q.get("status", "") == "completed",
-                    "completion_percentage": 100 if q.get("status") == "completed" else 0,
-                    "notes": q.get("notes", "")
-                }
-                for q in quests_data[-5:]  # Last 5 quests
-            ]
-        
-        # Step 3: Get health stats
+
+        previous_quests = [
+            {
+                "quest_name": q.get("quest_name", ""),
+                "difficulty": q.get("difficulty", "medium"),
+                "completed": q.get("completed", False),
+                "completion_percentage": 100 if q.get("completed") else 0,
+                "notes": q.get("notes", "")
+            }
+            for q in (quests_data or [])[-5:]  # Last 5 quests
+        ]
+
         health_stats = {}
-        health_response = requests.get(f"{self.backend_url}/health-stats/{user_id}/latest")
-        if health_response.status_code == 200:
-            health_data = health_response.json()
+        if health_data:
+            latest = health_data[-1]
             health_stats = {
-                "average_steps": health_data.get("steps", 0),
-                "average_heart_rate": health_data.get("heart_rate", 70),
-                "sleep_hours": health_data.get("sleep_hours", 7),
-                "active_minutes": health_data.get("active_minutes", 0)
+                "average_steps": latest.get("steps") or 0,
+                "average_heart_rate": latest.get("heart_rate", 70),
+                "sleep_hours": latest.get("sleep_hours") or 7,
+                "active_minutes": latest.get("workout_minutes") or 0
             }
-        
+
         # Prepare AI request
         ai_request = {
             "user_info": {
@@ -79,104 +159,137 @@ class AITrainerIntegration:
             "previous_quests": previous_quests,
             "num_quests": 3
         }
-        
-        # Step 4: Call AI to generate quests
-        ai_response = requests.post(f"{self.ai_url}/generate-quests", json=ai_request)
-        
+
+        # Step 2: Call AI to generate quests (no side effects, so safe to retry)
+        try:
+            ai_response = await self.request("POST", f"{self.ai_url}/generate-quests",
+                                             json=ai_request, timeout=AI_TIMEOUT_SECONDS)
+        except httpx.HTTPError as e:
+            return {"error": "Failed to generate quests", "details": repr(e)}
+
         if ai_response.status_code != 200:
             return {"error": "Failed to generate quests", "details": ai_response.json()}
-        
+
         ai_data = ai_response.json()
         generated_quests = ai_data["quests"]
-        
-        # Step 5: Save quests to backend
-        saved_quests = []
-        for quest in generated_quests:
-            quest_payload = {
-                "quest_name": quest["title"],
-                "description": quest["description"],
-                "points": quest["points"],
-                "difficulty": quest["difficulty"],
-                "category": quest["category"],
-                "target_value": quest["target_value"],
-                "target_unit": quest["target_unit"],
-                "duration_days": quest["duration_days"]
-            }
-            
-            # Save to backend
-            save_response = requests.post(f"{self.backend_url}/quests", json=quest_payload)
-            
-            if save_response.status_code == 200:
-                quest_id = save_response.json().get("quest_id")
-                
-                # Assign quest to user
-                assign_response = requests.post(
-                    f"{self.backend_url}/users/{user_id}/quests/{quest_id}"
-                )
-                
-                if assign_response.status_code == 200:
-                    saved_quests.append({
-                        "quest_id": quest_id,
-                        "quest": quest
-                    })
-        
+
+        # Step 3: Save quests to backend and assign them to the user
+        saved_quests = await self._save_quests(user_id, generated_quests)
+        if saved_quests is None:
+            return {"error": "Failed to save quests"}
+
         return {
             "success": True,
             "personalized_message": ai_data["personalized_message"],
             "quests": saved_quests,
             "timestamp": ai_data["timestamp"]
         }
-    
-    def chat_with_context(self, user_id: int, message: str) -> Dict[str, Any]:
+
+    async def _save_quests(self, user_id: int, quests: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
         """
-        Chat with AI trainer using context from backend
+        Creates the quests and their assignments with one bulk request each.
+        The batch keys make both safe to retry: the backend applies each batch once.
+        """
+        batch_key = f"ai-quests-{user_id}-{uuid.uuid4().hex}"
+        quests_payload = {
+            "batch_key": batch_key,
+            "quests": [
+                {
+                    "quest_name": quest["title"][:100],
+                    "quest_description": quest["description"],
+                    "quest_type": "weekly",
+                    "points_reward": quest["points"],
+                    # Personal quests stay out of the shared quest list
+                    "is_active": False
+                }
+                for quest in quests
+            ]
+        }
+
+        try:
+            save_response = await self.request("POST", f"{self.backend_url}/quests/bulk", json=quests_payload)
+            if save_response.status_code != 200:
+                print(f"Saving quests failed: {save_response.status_code} {save_response.text}")
+                return None
+            quest_ids = save_response.json()["quest_ids"]
+
+            assign_response = await self.request("POST", f"{self.backend_url}/user-quests/bulk", json={
+                "batch_key": f"{batch_key}-assign",
+                "assignments": [{"user_id": user_id, "quest_id": quest_id} for quest_id in quest_ids]
+            })
+        except httpx.HTTPError as e:
+            print(f"Saving quests failed: {e!r}")
+            return None
+
+        if assign_response.status_code != 200:
+            print(f"Assigning quests failed: {assign_response.status_code} {assign_response.text}")
+            return None
+        return [{"quest_id": quest_id, "quest": quest} for quest_id, quest in zip(quest_ids, quests)]
+
+    async def chat_with_context(self, user_id: int, message: str) -> Dict[str, Any]:
+        """
+        Chat with AI trainer. The trainer keeps the conversation and a snapshot of
+        the user's stats itself, so no backend requests are made per message.
         """
-        
-        # Get recent health stats for context
-        context = {}
-        
-        health_response = requests.get(f"{self.backend_url}/health-stats/{user_id}/today")
-        if health_response.status_code == 200:
-            health_data = health_response.json()
-            context = {
-                "steps": health_data.get("steps", 0),
-                "heart_rate": health_data.get("heart_rate", 0),
-                "active_minutes": health_data.get("active_minutes", 0),
-                "calories": health_data.get("calories", 0)
-            }
-        
-        # Get completed quests count
-        quests_response = requests.get(f"{self.backend_url}/users/{user_id}/quests")
-        if quests_response.status_code == 200:
-            quests = quests_response.json()
-            completed_count = sum(1 for q in quests if q.get("status") == "completed")
-            context["completed_quests"] = completed_count
-        
-        # Call AI chat
         chat_request = {
             "user_id": user_id,
-            "message": message,
-            "context": context
+            "message": message
         }
-        
-        response = requests.post(f"{self.ai_url}/chat", json=chat_request)
-        
+
+        try:
+            response = await self.request("POST", f"{self.ai_url}/chat", json=chat_request, timeout=AI_TIMEOUT_SECONDS)
+        except httpx.HTTPError as e:
+            return {"error": "Chat failed", "details": repr(e)}
+
         if response.status_code == 200:
             return response.json()
         else:
             return {"error": "Chat failed", "details": response.json()}
 
 
+class AITrainerIntegration:
+    """
+    Synchronous wrapper around AsyncAITrainerIntegration for scripts and other
+    non-async callers. Keeps one event loop and connection pool across calls;
+    call close() (or use it as a context manager) when done.
+    """
+
+    def __init__(self, ai_url: str = AI_SERVICE_URL, backend_url: str = BACKEND_SERVICE_URL, **client_options):
+        self._runner = asyncio.Runner()
+        self._integration = self._runner.run(self._create(ai_url, backend_url, client_options))
+
+    @staticmethod
+    async def _create(ai_url, backend_url, client_options):
+        # Built inside the runner's loop, which then owns the connection pool
+        return AsyncAITrainerIntegration(ai_url, backend_url, **client_options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._runner.run(self._integration.aclose())
+        self._runner.close()
+
+    def generate_and_save_quests(self, user_id: int) -> Dict[str, Any]:
+        return self._runner.run(self._integration.generate_and_save_quests(user_id))
+
+    def chat_with_context(self, user_id: int, message: str) -> Dict[str, Any]:
+        return self._runner.run(self._integration.chat_with_context(user_id, message))
+
+
 # Example usage functions
 def example_generate_weekly_quests(user_id: int):
     """Example: Generate weekly quests for a user"""
-    integration = AITrainerIntegration()
-    result = integration.generate_and_save_quests(user_id)
-    
+    with AITrainerIntegration() as integration:
+        result = integration.generate_and_save_quests(user_id)
+
     if result.get("success"):
         print(f"✅ Generated {len(result['quests'])} quests for user {user_id}")
         print(f"\n💬 Coach says: {result['personalized_message']}\n")
-        
+
         for quest_data in result["quests"]:
             quest = quest_data["quest"]
             print(f"🎯 {quest['title']}")
@@ -187,30 +300,29 @@ def example_generate_weekly_quests(user_id: int):
 
 def example_chat_session(user_id: int):
     """Example: Chat session with context"""
-    integration = AITrainerIntegration()
-    
-    # User asks for motivation
-    print("User: I'm feeling tired today. Should I exercise?")
-    response = integration.chat_with_context(user_id, "I'm feeling tired today. Should I exercise?")
-    print(f"Coach Star: {response['response']}\n")
-    
-    # User asks for advice
-    print("User: What's a good quick workout?")
-    response = integration.chat_with_context(user_id, "What's a good quick 15-minute workout I can do right now?")
-    print(f"Coach Star: {response['response']}\n")
+    with AITrainerIntegration() as integration:
+        # User asks for motivation
+        print("User: I'm feeling tired today. Should I exercise?")
+        response = integration.chat_with_context(user_id, "I'm feeling tired today. Should I exercise?")
+        print(f"Coach Star: {response.get('response', response)}\n")
+
+        # User asks for advice
+        print("User: What's a good quick workout?")
+        response = integration.chat_with_context(user_id, "What's a good quick 15-minute workout I can do right now?")
+        print(f"Coach Star: {response.get('response', response)}\n")
 
 
 if __name__ == "__main__":
     print("🔗 AI Trainer Integration Examples\n")
-    
+
     # Test with user_id = 1
     USER_ID = 1
-    
+
     print("=" * 60)
     print("Example 1: Generate Weekly Quests")
     print("=" * 60)
     example_generate_weekly_quests(USER_ID)
-    
+
     print("\n" + "=" * 60)
     print("Example 2: Chat Session")
     print("=" * 60)
@@ -0,0 +1,222 @@
+"""
+LLM providers for the AI trainer.
+
+fitness_trainer.py asks a provider for its models and embeddings; every model
+offers generate_content_async(prompt, stream=False) shaped like Gemini's
+(answers with .text and .usage_metadata, streams of chunks with .text).
+
+- GeminiProvider: Google Gemini, needs GEMINI_API_KEY.
+- LocalProvider:  an offline stand-in for load tests and benchmarks. Answers
+  are derived from a hash of the prompt (the same prompt always gets the same
+  answer; quest models return JSON that validates), while latency, streaming
+  speed, failures and stalls follow the configured distributions. It measures
+  the trainer's own overhead and concurrency behaviour without network access.
+
+Pick one with LLM_PROVIDER=gemini|local (make_provider).
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+
+from fallbacks import QUEST_TEMPLATES, DIFFICULTY_POINTS
+
+# Local stand-in: time-to-first-token distribution in ms (see parse_latency),
+# generation speed, share of calls that fail or never answer, and an optional
+# seed for repeatable runs
+LOCAL_LLM_LATENCY = os.getenv("LOCAL_LLM_LATENCY", "lognormal:800:0.4")
+LOCAL_LLM_TOKENS_PER_SECOND = float(os.getenv("LOCAL_LLM_TOKENS_PER_SECOND", "80"))
+LOCAL_LLM_FAILURE_RATE = float(os.getenv("LOCAL_LLM_FAILURE_RATE", "0"))
+LOCAL_LLM_STALL_RATE = float(os.getenv("LOCAL_LLM_STALL_RATE", "0"))
+LOCAL_LLM_SEED = os.getenv("LOCAL_LLM_SEED")
+
+# Roughly 4 characters per token, as in prompts.py
+CHARS_PER_TOKEN = 4
+
+
+class GeminiProvider:
+    def __init__(self, api_key: str | None = None, embed_model: str = "models/text-embedding-004"):
+        import google.generativeai as genai
+
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.embed_model = embed_model
+
+    def model(self, name: str, system_instruction: str | None = None, response_schema=None):
+        """A Gemini model; with response_schema its answers are JSON constrained to it."""
+        generation_config = None
+        if response_schema is not None:
+            generation_config = self.genai.GenerationConfig(
+                response_mime_type="application/json", response_schema=response_schema
+            )
+        return self.genai.GenerativeModel(
+            name, system_instruction=system_instruction, generation_config=generation_config
+        )
+
+    async def embed(self, text: str) -> list[float]:
+        result = await self.genai.embed_content_async(
+            model=self.embed_model, content=text, task_type="SEMANTIC_SIMILARITY"
+        )
+        return result["embedding"]
+
+
+class LocalProviderError(Exception):
+    """Simulated upstream failure."""
+
+
+class Usage:
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = completion_tokens
+        self.total_token_count = prompt_tokens + completion_tokens
+
+
+class LocalAnswer:
+    def __init__(self, text: str, usage: Usage | None = None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+def parse_latency(spec: str):
+    """
+    Sampler for a latency spec in milliseconds, returning seconds:
+    "fixed:MS", "uniform:MIN:MAX", "lognormal:MEDIAN:SIGMA" or
+    "exponential:MEAN".
+    """
+    kind, *args = spec.split(":")
+    values = [float(arg) for arg in args]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1]) / 1000
+    if kind == "exponential" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) / 1000
+    raise ValueError(f"Unknown latency spec {spec!r}; use fixed:MS, uniform:MIN:MAX, lognormal:MEDIAN:SIGMA or exponential:MEAN")
+
+
+CHAT_OPENERS = [
+    "Great question, champion! 💪",
+    "Love the energy! 🔥",
+    "You're doing better than you think! 🌟",
+    "Let's make today count! 🚀",
+]
+CHAT_TIPS = [
+    "A brisk 15-minute walk is a perfect way to keep your streak alive.",
+    "Warm up for five minutes, then try three rounds of squats, push-ups and planks.",
+    "Rest is part of training: stretch, hydrate and get a good night's sleep.",
+    "Pick one small goal for today and crush it before dinner.",
+    "Consistency beats intensity. Showing up is already a win!",
+]
+
+
+class LocalModel:
+    def __init__(self, provider: "LocalProvider", json_output: bool, system_instruction: str | None = None):
+        self.provider = provider
+        self.json_output = json_output
+        self.system_instruction = system_instruction or ""
+
+    def answer(self, prompt: str) -> str:
+        seed = int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:8], "big")
+        if not self.json_output:
+            return f"{CHAT_OPENERS[seed % len(CHAT_OPENERS)]} {CHAT_TIPS[seed // 7 % len(CHAT_TIPS)]}"
+
+        match = re.search(r"Generate (\d+) ", prompt)
+        categories = list(QUEST_TEMPLATES)
+        quests = []
+        for i in range(int(match.group(1)) if match else 3):
+            category = categories[(seed + i) % len(categories)]
+            templates = QUEST_TEMPLATES[category]
+            template = templates[(seed // 11 + i) % len(templates)]
+            quests.append({
+                "title": template["title"],
+                "description": template["description"],
+                "difficulty": "medium",
+                "category": category,
+                "target_value": template["target_value"],
+                "target_unit": template["target_unit"],
+                "duration_days": template["duration_days"],
+                "points": DIFFICULTY_POINTS["medium"],
+                "motivational_message": template["motivational_message"],
+            })
+        return json.dumps({"quests": quests, "personalized_message": CHAT_OPENERS[seed % len(CHAT_OPENERS)]})
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        text = self.answer(prompt)
+        # Billed like Gemini: the system instruction counts towards the prompt
+        prompt_chars = len(self.system_instruction) + len(prompt)
+        usage = Usage(-(-prompt_chars // CHARS_PER_TOKEN), -(-len(text) // CHARS_PER_TOKEN))
+        if stream:
+            # The first chunk (like Gemini's) only arrives after the first-token latency
+            await self.provider.first_token()
+            return self.provider.stream(text, usage)
+        await self.provider.first_token()
+        await asyncio.sleep(usage.candidates_token_count / self.provider.tokens_per_second)
+        return LocalAnswer(text, usage)
+
+
+class LocalProvider:
+    """
+    latency:           spec for time to first token (see parse_latency)
+    tokens_per_second: generation speed after the first token
+    failure_rate:      share of calls that raise LocalProviderError
+    stall_rate:        share of calls that never answer (to exercise timeouts)
+    seed:              makes latencies and failures repeatable
+    """
+
+    def __init__(self, latency: str = "lognormal:800:0.4", tokens_per_second: float = 80.0,
+                 failure_rate: float = 0.0, stall_rate: float = 0.0, seed: int | None = None):
+        self.sample_latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.stall_rate = stall_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def model(self, name: str, system_instruction: str | None = None, response_schema=None):
+        return LocalModel(self, response_schema is not None, system_instruction)
+
+    async def first_token(self):
+        self.calls += 1
+        await asyncio.sleep(self.sample_latency(self.rng))
+        roll = self.rng.random()
+        if roll < self.stall_rate:
+            await asyncio.Event().wait()
+        if roll < self.stall_rate + self.failure_rate:
+            raise LocalProviderError("simulated upstream failure")
+
+    async def stream(self, text: str, usage: Usage):
+        words = re.findall(r"\S+\s*", text)
+        for i in range(0, len(words), 4):
+            chunk = "".join(words[i:i + 4])
+            if i:
+                await asyncio.sleep(len(chunk) / CHARS_PER_TOKEN / self.tokens_per_second)
+            last = i + 4 >= len(words)
+            yield LocalAnswer(chunk, usage if last else None)
+
+    async def embed(self, text: str) -> list[float]:
+        """Hashed bag of words: messages sharing words come out similar."""
+        vector = [0.0] * 64
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        return vector
+
+
+def make_provider(name: str, embed_model: str = "models/text-embedding-004"):
+    """Provider for LLM_PROVIDER; the local one is configured by the LOCAL_LLM_* settings."""
+    if name == "gemini":
+        return GeminiProvider(embed_model=embed_model)
+    if name == "local":
+        return LocalProvider(
+            LOCAL_LLM_LATENCY, LOCAL_LLM_TOKENS_PER_SECOND, LOCAL_LLM_FAILURE_RATE, LOCAL_LLM_STALL_RATE,
+            int(LOCAL_LLM_SEED) if LOCAL_LLM_SEED else None,
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER {name!r}; use gemini or local")
@@ -0,0 +1,263 @@
+"""
+Prompt assembly for the AI trainer.
+
+The static instructions (the coach persona and the quest designer brief with
+its answer format) never change between requests, so they are built once at
+import and given to the Gemini models as their system instruction. Each
+request then only carries its user-specific part, and every call starts with
+the same prefix, which Gemini can reuse across calls. The instructions are far
+below the minimum size for explicitly cached content, so no cache object is
+created for them.
+
+The user-specific part is fitted to a token budget: health stats are capped,
+quest history keeps the most recent quests that fit and sums up the older
+ones in one line, chat history keeps the conversation summary and the newest
+messages that fit, and long chat messages are cut. Token counts are estimated
+from the text length; Gemini's count_tokens would cost a round trip per
+request.
+"""
+
+import os
+
+from response_cache import bucket_value, normalise_context
+
+# Token budgets for the user-specific part of a prompt (the system instruction
+# comes on top), and the most health stats listed in a quest prompt
+CHAT_PROMPT_TOKEN_BUDGET = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "800"))
+QUEST_PROMPT_TOKEN_BUDGET = int(os.getenv("QUEST_PROMPT_TOKEN_BUDGET", "600"))
+PROMPT_MAX_HEALTH_STATS = int(os.getenv("PROMPT_MAX_HEALTH_STATS", "12"))
+
+# Characters kept from a previous quest's notes, and from each earlier chat message
+NOTES_MAX_CHARS = 120
+TURN_MAX_CHARS = 320
+
+# Roughly 4 characters per token for English text
+CHARS_PER_TOKEN = 4
+
+FITNESS_TRAINER_PROMPT = """You are an enthusiastic, motivating, and knowledgeable fitness trainer named Coach Natalia.
+Your personality:
+- Energetic and positive, always encouraging users
+- Use motivational language and emojis appropriately
+- Personalize advice based on user's fitness level and goals
+- Be supportive but also challenge users to push their limits
+- Celebrate achievements, no matter how small
+- Provide practical, safe fitness advice
+- Keep responses concise but impactful (2-3 sentences usually)
+
+Your expertise:
+- Exercise routines and proper form
+- Nutrition basics and healthy eating
+- Goal setting and motivation
+- Progress tracking and accountability
+- Injury prevention and recovery
+
+Remember: You're not just giving information, you're being a supportive coach and cheerleader!"""
+
+QUEST_GENERATOR_PROMPT = """You are a creative fitness quest designer for the StarLife app.
+Your role is to create engaging, achievable fitness quests (challenges) based on:
+- User's current fitness level
+- Previous quest performance
+- User's goals and preferences
+- Progressive difficulty
+
+Quest Guidelines:
+- Make quests specific, measurable, achievable, relevant, and time-bound (SMART)
+- Include variety: cardio, strength, flexibility, mindfulness
+- Balance challenge with achievability
+- Consider user's available time and resources
+- Make quests engaging and fun, not just boring exercises
+
+Quest difficulty levels:
+- Easy: Suitable for beginners, low impact
+- Medium: Moderate intensity, requires some fitness
+- Hard: High intensity, for experienced users
+- Expert: Advanced challenges for fitness enthusiasts"""
+
+QUEST_ANSWER_FORMAT = """Answer with a JSON object: "quests" holds one object per quest, and
+"personalized_message" is an encouraging message to the user about their
+progress and these new quests. For EACH quest:
+- title: catchy, motivating title
+- description: clear explanation of what to do
+- difficulty: easy/medium/hard/expert based on user level
+- category: cardio/strength/flexibility/mindfulness/hybrid
+- target_value: a plain whole number, no separators or units
+- target_unit: steps/reps/minutes/sessions/etc
+- duration_days: how many days to complete, typically 1-7
+- points: reward points (easy=10-30, medium=40-70, hard=80-120, expert=130-200)
+- motivational_message: encouraging message for this specific quest"""
+
+# System instructions for the chat and quest models
+CHAT_SYSTEM_INSTRUCTION = (
+    FITNESS_TRAINER_PROMPT
+    + "\n\nRespond as Coach Star, their personal fitness trainer. Be encouraging, specific, and actionable."
+)
+QUEST_SYSTEM_INSTRUCTION = QUEST_GENERATOR_PROMPT + "\n\n" + QUEST_ANSWER_FORMAT
+SUMMARY_SYSTEM_INSTRUCTION = """You keep notes on a conversation between a fitness coach and a user.
+Update the summary with the new messages in at most 4 sentences. Keep what the
+user said about their goals, health, injuries, preferences and plans, and the
+advice they were given; drop greetings and small talk. Answer with the summary only."""
+
+# Chat context keys and how they are shown to the model
+CHAT_CONTEXT_LINES = [
+    ("steps", "Recent steps: {}"),
+    ("heart_rate", "Heart rate: {} bpm"),
+    ("active_minutes", "Active minutes today: {}"),
+    ("completed_quests", "Completed quests this week: {}"),
+]
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+CHAT_SYSTEM_TOKENS = estimate_tokens(CHAT_SYSTEM_INSTRUCTION)
+QUEST_SYSTEM_TOKENS = estimate_tokens(QUEST_SYSTEM_INSTRUCTION)
+
+# Prompts built since startup, per kind: estimated tokens including the system
+# instruction, and how many had to be shortened to fit the budget
+prompt_stats = {
+    kind: {"prompts": 0, "estimated_tokens": 0, "trimmed": 0, "system_tokens": system_tokens}
+    for kind, system_tokens in (("chat", CHAT_SYSTEM_TOKENS), ("quests", QUEST_SYSTEM_TOKENS))
+}
+
+
+def record_prompt(kind: str, text: str, trimmed: bool) -> int:
+    """Counts a built prompt; returns its estimated tokens including the system instruction."""
+    stats = prompt_stats[kind]
+    tokens = stats["system_tokens"] + estimate_tokens(text)
+    stats["prompts"] += 1
+    stats["estimated_tokens"] += tokens
+    stats["trimmed"] += trimmed
+    return tokens
+
+
+def prompt_report() -> dict:
+    return {
+        kind: {**stats, "avg_tokens": round(stats["estimated_tokens"] / stats["prompts"]) if stats["prompts"] else None}
+        for kind, stats in prompt_stats.items()
+    }
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """text cut to about max_tokens, at a word boundary where possible."""
+    max_chars = max(max_tokens, 0) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars < 2:
+        return ""
+    cut = text[:max_chars - 1]
+    if " " in cut[max_chars // 2:]:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut + "…"
+
+
+def build_chat_prompt(message: str, context: dict | None = None, history: dict | None = None) -> str:
+    """
+    User part of the Coach prompt: bucketed context, the conversation so far
+    (summary and the newest messages that fit the budget), then the message.
+    """
+    # Bucketed values, so every request sharing a cache key gets an answer that fits it
+    context = normalise_context(context) or {}
+    lines = ["User context:"] if any(key in context for key, _ in CHAT_CONTEXT_LINES) else []
+    lines += [f"- {label.format(context[key])}" for key, label in CHAT_CONTEXT_LINES if key in context]
+
+    message = message.strip()
+    used = estimate_tokens("\n".join(lines)) + 5  # "User message: "
+    kept_message = truncate(message, CHAT_PROMPT_TOKEN_BUDGET - used)
+    used += estimate_tokens(kept_message)
+    trimmed = len(kept_message) < len(message)
+
+    if history:
+        summary = history.get("summary")
+        turns = history.get("turns") or []
+        recent = []
+        if summary:
+            summary = truncate(summary, CHAT_PROMPT_TOKEN_BUDGET - used - 10)
+            used += estimate_tokens(summary) + 10
+            trimmed = trimmed or summary != history["summary"]
+        for role, text in reversed(turns):
+            line = f"- {'Coach' if role == 'coach' else 'User'}: {truncate(text.strip(), TURN_MAX_CHARS // CHARS_PER_TOKEN)}"
+            if used + estimate_tokens(line) + 1 > CHAT_PROMPT_TOKEN_BUDGET:
+                trimmed = True
+                break
+            recent.insert(0, line)
+            used += estimate_tokens(line) + 1
+        if summary:
+            lines += ["", f"Earlier in this conversation: {summary}"]
+        if recent:
+            lines += ["", "Recent messages:"] + recent
+
+    prompt = "\n".join(lines + ["", f"User message: {kept_message}"]).lstrip()
+    record_prompt("chat", prompt, trimmed)
+    return prompt
+
+
+def build_summary_prompt(summary: str | None, turns: list) -> str:
+    """Prompt for folding older chat messages into a conversation's summary."""
+    lines = [f"Current summary: {summary or 'none yet'}", "", "New messages:"]
+    lines += [f"- {'Coach' if role == 'coach' else 'User'}: {truncate(text.strip(), TURN_MAX_CHARS // CHARS_PER_TOKEN)}"
+              for role, text in turns]
+    return "\n".join(lines)
+
+
+def quest_line(quest) -> list[str]:
+    percentage = bucket_value("percentage", quest.completion_percentage)
+    status = "✅ Completed" if quest.completed else f"⏸️ {percentage}% completed"
+    lines = [f"- {quest.quest_name} ({quest.difficulty}): {status}"]
+    if quest.notes:
+        lines.append(f"  Notes: {truncate(quest.notes.strip(), NOTES_MAX_CHARS // CHARS_PER_TOKEN)}")
+    return lines
+
+
+def build_quest_prompt(request) -> str:
+    """
+    User part of the quest prompt for one QuestGenerationRequest. Numbers are
+    bucketed and the user id left out, so similar profiles share a cached
+    answer. previous_quests is taken oldest first.
+    """
+    user_info = request.user_info
+    age = bucket_value("age", user_info.age) if user_info.age else None
+    available_time = bucket_value("available_time", user_info.available_time) if user_info.available_time else None
+    lines = [
+        "User Profile:",
+        f"- Age: {age or 'Not specified'}",
+        f"- Fitness Level: {user_info.fitness_level.lower()}",
+        f"- Goals: {', '.join(sorted(user_info.goals))}",
+        f"- Available Time: {available_time or 'Not specified'} minutes/day",
+        f"- Equipment: {', '.join(sorted(user_info.equipment)) if user_info.equipment else 'None'}",
+    ]
+
+    health_stats = sorted((normalise_context(user_info.health_stats) or {}).items())
+    trimmed = len(health_stats) > PROMPT_MAX_HEALTH_STATS
+    if health_stats:
+        lines += ["", "Recent Health Stats:"]
+        lines += [f"- {key}: {value}" for key, value in health_stats[:PROMPT_MAX_HEALTH_STATS]]
+
+    request_line = f"Generate {request.num_quests} personalized fitness quests for this user."
+    used = estimate_tokens("\n".join(lines + [request_line])) + 20  # headings and the summary line
+
+    # Newest quests first until the budget runs out; the rest become one summary line
+    previous_quests = request.previous_quests or []
+    history = []
+    for kept, quest in enumerate(reversed(previous_quests)):
+        entry = quest_line(quest)
+        cost = estimate_tokens("\n".join(entry)) + 1
+        if used + cost > QUEST_PROMPT_TOKEN_BUDGET:
+            break
+        history[:0] = entry
+        used += cost
+    else:
+        kept = len(previous_quests)
+
+    if previous_quests:
+        older = previous_quests[:len(previous_quests) - kept]
+        lines += ["", "Previous Quest Performance:"]
+        if older:
+            trimmed = True
+            completed = sum(quest.completed for quest in older)
+            lines.append(f"- {len(older)} earlier quests: {completed} completed")
+        lines += history
+
+    prompt = "\n".join(lines + ["", request_line])
+    record_prompt("quests", prompt, trimmed)
+    return prompt
@@ -0,0 +1,209 @@
+"""
+Resilience layer around the Gemini models.
+
+Each model gets an LLMGuard with:
+- a circuit breaker: after failure_threshold failed calls in a row (errors or
+  timeouts) it opens and rejects calls at once for reset_timeout seconds, then
+  lets a single probe through (half-open); the probe closes it again or
+  reopens it. Callers serve fallbacks while it rejects, instead of queueing.
+- an adaptive timeout: p95 of recent successful calls times a multiplier,
+  kept between min_timeout and max_timeout (max_timeout until there are
+  enough samples).
+- optional hedging: when a call is still running after the hedge_quantile
+  latency, a second identical call is started and the first answer wins.
+  Hedges are capped at hedge_max_ratio of calls, since each one is paid for.
+
+Client cancellations (disconnects) count neither as failures nor successes.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+# Numeric state for metrics
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.opened = 0  # times the breaker tripped
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+        return self._state
+
+    def admit(self):
+        """Reserves a call, or raises CircuitOpenError. Half-open admits one probe at a time."""
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(f"circuit open, retry in {self.retry_after():.0f}s")
+
+    def retry_after(self) -> float:
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 1.0)
+
+    def abandon(self):
+        """An admitted call ended without an outcome (cancelled, or never started)."""
+        self.probing = False
+
+    def record_success(self):
+        self.probing = False
+        self.consecutive_failures = 0
+        self._state = CLOSED
+
+    def record_failure(self):
+        self.probing = False
+        self.consecutive_failures += 1
+        if self._state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.opened += 1
+            self._state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Durations of the most recent successful calls."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class LLMGuard:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 min_timeout: float = 5.0, max_timeout: float = 30.0, timeout_multiplier: float = 2.0,
+                 hedge_quantile: float = 0.0, hedge_max_ratio: float = 0.1, min_samples: int = 20):
+        self.name = name
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyTracker()
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.hedge_quantile = hedge_quantile
+        self.hedge_max_ratio = hedge_max_ratio
+        self.min_samples = min_samples
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0  # answers served from fallbacks, counted by the caller
+
+    def admit(self):
+        self.breaker.admit()
+
+    def abandon(self):
+        self.breaker.abandon()
+
+    def timeout(self) -> float:
+        p95 = self.latency.quantile(0.95)
+        if p95 is None or len(self.latency.samples) < self.min_samples:
+            return self.max_timeout
+        return min(max(p95 * self.timeout_multiplier, self.min_timeout), self.max_timeout)
+
+    def hedge_delay(self):
+        if self.hedge_quantile <= 0 or len(self.latency.samples) < self.min_samples:
+            return None
+        if self.hedges >= self.hedge_max_ratio * max(self.calls, 1):
+            return None
+        return self.latency.quantile(self.hedge_quantile)
+
+    def record_success(self, seconds: float):
+        self.breaker.record_success()
+        self.latency.record(seconds)
+
+    def record_failure(self, timed_out: bool = False):
+        self.failures += 1
+        self.timeouts += timed_out
+        self.breaker.record_failure()
+
+    async def call(self, attempt, hedge=None, timeout: float | None = None):
+        """
+        Result of attempt() (a coroutine factory) within timeout (default: the
+        adaptive one), racing hedge() against it when the call runs long.
+        admit() first. Raises asyncio.TimeoutError when the timeout runs out.
+        """
+        self.calls += 1
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(self._race(attempt, hedge), timeout=timeout or self.timeout())
+        except asyncio.CancelledError:
+            self.abandon()
+            raise
+        except asyncio.TimeoutError:
+            self.record_failure(timed_out=True)
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    async def _race(self, attempt, hedge):
+        primary = asyncio.ensure_future(attempt())
+        delay = self.hedge_delay() if hedge is not None else None
+        if delay is None:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                tasks.add(asyncio.ensure_future(hedge()))
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.hedge_wins += task is not primary
+                        return task.result()
+            # Both failed; the primary's error is the one worth reporting
+            raise primary.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        state = self.breaker.state
+        p50, p95 = self.latency.quantile(0.5), self.latency.quantile(0.95)
+        return {
+            "state": state,
+            "state_code": STATE_CODES[state],
+            "opened": self.breaker.opened,
+            "rejected": self.breaker.rejected,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "timeout_seconds": round(self.timeout(), 2),
+            "p50_seconds": round(p50, 3) if p50 is not None else None,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,235 @@
+"""
+Response cache for the AI trainer.
+
+Gemini answers take seconds and cost money, while many requests are
+near-duplicates: "should I skip my workout, I'm tired" with roughly the same
+step count, or quest generation for the same kind of profile. Requests are
+reduced to a normalised form first (numbers bucketed with bucket_value, user
+ids dropped, message text lower-cased) and the answer is cached under a hash
+of that form.
+
+Two tiers:
+- exact:   same normalised request.
+- similar: optional. The message is embedded and compared (cosine similarity)
+           with cached messages that share the same bucketed context; the best
+           match above the threshold is served.
+
+Entries are evicted least-recently-used once the cache holds max_entries and
+expire after ttl seconds. Concurrent requests for the same key share a single
+model call; only successful answers are cached.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+
+# Bucket widths for numeric values, matched against the value's key name
+# (first match wins, so "average_steps" buckets like "steps")
+BUCKETS = [
+    ("steps", 1000),
+    ("heart_rate", 5),
+    ("active_minutes", 10),
+    ("sleep", 0.5),
+    ("available_time", 15),
+    ("percentage", 10),
+    ("age", 5),
+]
+
+
+def bucket_value(key: str, value):
+    """Rounds numbers to their bucket; other numbers keep two significant digits."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value.strip().lower() if isinstance(value, str) else value
+    for name, width in BUCKETS:
+        if name in key:
+            rounded = round(value / width) * width
+            return int(rounded) if float(rounded).is_integer() else rounded
+    if value == 0:
+        return 0
+    rounded = round(value, 1 - int(math.floor(math.log10(abs(value)))))
+    return int(rounded) if float(rounded).is_integer() else rounded
+
+
+def normalise_context(context: dict | None) -> dict | None:
+    """Context/health-stat dict with every numeric value bucketed."""
+    if not context:
+        return context
+    return {key: bucket_value(key, value) for key, value in context.items()}
+
+
+def normalise_text(text: str) -> str:
+    """Lower-cased, single-spaced, without trailing punctuation."""
+    return re.sub(r"\s+", " ", text).strip().lower().rstrip(" .!?")
+
+
+def cache_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _unit(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class ResponseCache:
+    """
+    LRU/TTL cache of model answers.
+
+    embed: optional async callable text -> list[float]; enables the similarity
+           tier together with a similarity_threshold above 0.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0,
+                 similarity_threshold: float = 0.0, embed=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed if similarity_threshold > 0 else None
+        self._entries = OrderedDict()  # key -> {"value", "expires_at", "group", "embedding", "cost"}
+        self._pending = {}  # key -> Future of the call that is filling it
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.shared = 0  # misses that waited for an identical call instead of making one
+        self.evictions = 0
+        self.expirations = 0
+        self.embed_errors = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _embedding(self, text: str | None):
+        if self.embed is None or not text:
+            return None
+        try:
+            return _unit(await self.embed(text))
+        except Exception as e:
+            self.embed_errors += 1
+            print(f"Response cache embedding failed, using exact matches only: {e}")
+            return None
+
+    def _most_similar(self, group: str, embedding: list[float]):
+        best, best_score = None, self.similarity_threshold
+        now = time.monotonic()
+        for key, entry in self._entries.items():
+            if entry["group"] != group or entry["embedding"] is None or entry["expires_at"] <= now:
+                continue
+            score = sum(a * b for a, b in zip(embedding, entry["embedding"]))
+            if score >= best_score:
+                best, best_score = key, score
+        return best
+
+    async def lookup(self, key: str, group: str | None = None, text: str | None = None):
+        """
+        Returns (value, tier, embedding); tier is "exact", "similar" or None on a
+        miss. Pass the embedding back to store() so the text is embedded once.
+        """
+        if not self.enabled:
+            return None, None, None
+        entry = self._get(key)
+        if entry is not None:
+            self.hits += 1
+            self.saved_seconds += entry["cost"]
+            return entry["value"], "exact", entry["embedding"]
+
+        embedding = await self._embedding(text) if group is not None else None
+        if embedding is not None:
+            similar = self._most_similar(group, embedding)
+            if similar is not None:
+                entry = self._get(similar)
+                self.similar_hits += 1
+                self.saved_seconds += entry["cost"]
+                return entry["value"], "similar", embedding
+
+        self.misses += 1
+        return None, None, embedding
+
+    def store(self, key: str, value, group: str | None = None, embedding=None, cost: float = 0.0):
+        """cost: seconds the answer took, counted as saved on every later hit."""
+        if not self.enabled:
+            return
+        self._entries[key] = {
+            "value": value,
+            "expires_at": time.monotonic() + self.ttl,
+            "group": group,
+            "embedding": embedding,
+            "cost": cost,
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_create(self, key: str, create, group: str | None = None, text: str | None = None):
+        """
+        Cached value for key, or the result of `await create()` (stored on success).
+        Returns (value, tier) where tier is "exact", "similar", "shared" when it
+        waited for an identical request already in flight, or None.
+        """
+        value, tier, embedding = await self.lookup(key, group, text)
+        if tier is not None:
+            return value, tier
+        if not self.enabled:
+            return await create(), None
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            # asyncio.wait never cancels the shared call, even if this waiter is cancelled
+            await asyncio.wait({pending})
+            if not pending.cancelled() and pending.exception() is None:
+                self.shared += 1
+                return pending.result(), "shared"
+            # The shared call failed or its client went away; make our own
+            return await self.get_or_create(key, create, group, text)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        started = time.monotonic()
+        try:
+            value = await create()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # read by waiters, if any; don't log it as never retrieved
+            raise
+        else:
+            self.store(key, value, group, embedding, time.monotonic() - started)
+            future.set_result(value)
+            return value, None
+        finally:
+            self._pending.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_rate": round((self.hits + self.similar_hits) / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "embed_errors": self.embed_errors,
+            "saved_seconds": round(self.saved_seconds, 1),
+        }
@@ -0,0 +1,223 @@
+"""
+Async data-access layer for the StarLife backend.
+
+Endpoints always use the same shape, whichever backend is configured:
+
+    async with db.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, params)
+            row = await cur.fetchone()
+
+Several independent queries can share one round trip with
+`async with conn.pipeline():` (execute them all, then fetch).
+
+Rows come back as dicts. Query round trips are timed as the "db" phase and
+pool checkouts as "db_pool" (see instrumentation.py). Two backends are available (DB_BACKEND):
+- "async": psycopg 3 AsyncConnectionPool; queries never block the event loop.
+- "sync":  the psycopg2 ConnectionPool from db_pool.py, with every blocking
+           call pushed to Starlette's threadpool. Kept for A/B comparisons.
+"""
+
+import time
+from contextlib import asynccontextmanager
+
+from starlette.concurrency import run_in_threadpool
+
+from db_pool import ConnectionPool
+from instrumentation import record, timed
+
+DB_BACKENDS = ("async", "sync")
+
+
+def _timed_cursor_class():
+    """psycopg AsyncCursor counting each execute as a query; fetches add to its time."""
+    from psycopg import AsyncCursor
+
+    class TimedAsyncCursor(AsyncCursor):
+        async def execute(self, query, params=None, **kwargs):
+            with timed("db"):
+                return await super().execute(query, params, **kwargs)
+
+        async def executemany(self, query, params_seq, **kwargs):
+            with timed("db"):
+                return await super().executemany(query, params_seq, **kwargs)
+
+        async def fetchone(self):
+            # In a pipeline the round trip happens here rather than in execute
+            with timed("db", calls=0):
+                return await super().fetchone()
+
+        async def fetchall(self):
+            with timed("db", calls=0):
+                return await super().fetchall()
+
+    return TimedAsyncCursor
+
+
+class AsyncDatabase:
+    """psycopg 3 async connection pool."""
+
+    backend = "async"
+
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10, timeout: float = 5.0,
+                 max_idle: float = 300.0, max_lifetime: float = 3600.0):
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+
+        self.pool = AsyncConnectionPool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            timeout=timeout,
+            max_idle=max_idle,
+            max_lifetime=max_lifetime,
+            kwargs={"row_factory": dict_row, "cursor_factory": _timed_cursor_class()},
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+        )
+
+    async def open(self):
+        # Don't block startup on the database; the pool fills in the background
+        await self.pool.open(wait=False)
+
+    async def close(self):
+        await self.pool.close()
+
+    @asynccontextmanager
+    async def connection(self):
+        """Commits when the block exits cleanly, rolls back on error."""
+        started = time.perf_counter()
+        async with self.pool.connection() as conn:
+            record("db_pool", time.perf_counter() - started)
+            yield conn
+
+    def stats(self) -> dict:
+        raw = self.pool.get_stats()
+        size = raw.get("pool_size", 0)
+        idle = raw.get("pool_available", 0)
+        requests = raw.get("requests_num", 0)
+        return {
+            "backend": self.backend,
+            "min_size": raw.get("pool_min", self.pool.min_size),
+            "max_size": raw.get("pool_max", self.pool.max_size),
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "waiting": raw.get("requests_waiting", 0),
+            "checkouts": requests,
+            "timeouts": raw.get("requests_errors", 0),
+            "connections_created": raw.get("connections_num", 0),
+            "connections_discarded": raw.get("connections_lost", 0),
+            "checkout_wait_avg_ms": round(raw.get("requests_wait_ms", 0) / requests, 3) if requests else 0.0,
+        }
+
+
+class _ThreadedCursor:
+    """RealDictCursor wrapper whose blocking calls run in the threadpool."""
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    @property
+    def rowcount(self) -> int:
+        return self._cur.rowcount
+
+    async def execute(self, query, params=None):
+        with timed("db"):
+            await run_in_threadpool(self._cur.execute, query, params)
+
+    async def executemany(self, query, params_seq):
+        with timed("db"):
+            await run_in_threadpool(self._cur.executemany, query, params_seq)
+
+    async def fetchone(self):
+        with timed("db", calls=0):
+            return await run_in_threadpool(self._cur.fetchone)
+
+    async def fetchall(self):
+        with timed("db", calls=0):
+            return await run_in_threadpool(self._cur.fetchall)
+
+
+class _ThreadedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    @asynccontextmanager
+    async def cursor(self):
+        from psycopg2.extras import RealDictCursor
+
+        cur = self._conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            yield _ThreadedCursor(cur)
+        finally:
+            cur.close()
+
+    @asynccontextmanager
+    async def pipeline(self):
+        # psycopg2 has no pipeline mode; queries still run one round trip at a time
+        yield
+
+    async def commit(self):
+        await run_in_threadpool(self._conn.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self._conn.rollback)
+
+
+class ThreadedDatabase:
+    """psycopg2 ConnectionPool driven from the threadpool."""
+
+    backend = "sync"
+
+    def __init__(self, dsn: str, **pool_kwargs):
+        self.pool = ConnectionPool(dsn, **pool_kwargs)
+
+    async def open(self):
+        import psycopg2
+
+        try:
+            await run_in_threadpool(self.pool.warm)
+        except psycopg2.Error as e:
+            # Connections are opened lazily on first checkout if the database isn't up yet
+            print(f"Could not pre-open database connections: {e}")
+
+    async def close(self):
+        await run_in_threadpool(self.pool.close)
+
+    @asynccontextmanager
+    async def connection(self):
+        """Commits when the block exits cleanly, rolls back on error."""
+        import psycopg2
+
+        started = time.perf_counter()
+        conn = await run_in_threadpool(self.pool.getconn)
+        record("db_pool", time.perf_counter() - started)
+        discard = False
+        try:
+            yield _ThreadedConnection(conn)
+            await run_in_threadpool(conn.commit)
+        except Exception as exc:
+            if isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                discard = True
+            try:
+                await run_in_threadpool(conn.rollback)
+            except psycopg2.Error:
+                discard = True
+            raise
+        finally:
+            # Not awaited so the connection still goes back if the request was cancelled;
+            # putconn rolls back any transaction left open.
+            self.pool.putconn(conn, discard)
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, **self.pool.stats()}
+
+
+def create_database(backend: str, dsn: str, **pool_kwargs):
+    """Builds the database layer selected by `backend` ("async" or "sync")."""
+    if backend == "async":
+        return AsyncDatabase(dsn, **pool_kwargs)
+    if backend == "sync":
+        return ThreadedDatabase(dsn, **pool_kwargs)
+    raise ValueError(f"Unknown DB_BACKEND {backend!r}; expected one of {', '.join(DB_BACKENDS)}")
@@ -0,0 +1,193 @@
+"""
+Read-through cache for the StarLife catalog tables.
+
+rewards, quests, store_products and tier_benefits change only when an admin
+edits them, so endpoints read them through CatalogCache instead of querying
+on every request. Each catalog has a version counter in the cache backend;
+bumping it (CatalogCache.invalidate) makes every worker reload on its next
+read. Entries also expire after a TTL as a safety net for edits made
+directly in the database.
+
+Backends (CACHE_URL):
+- unset / "memory://": per-process dict. Versions are per worker, so an
+  invalidation only reaches the worker that handled it until the TTL expires.
+- "redis://...":       shared Redis (or any Redis-compatible server). Versions
+  and loaded catalogs are shared by all workers. Needs `pip install redis`.
+"""
+
+import json
+import time
+from decimal import Decimal
+
+CATALOG_QUERIES = {
+    "rewards": """
+        SELECT reward_id, reward_name, reward_description, cost
+        FROM rewards
+        WHERE is_active = TRUE
+        ORDER BY reward_id
+    """,
+    "quests": """
+        SELECT quest_id, quest_name, quest_description, quest_type, points_reward
+        FROM quests
+        WHERE is_active = TRUE
+        ORDER BY quest_type, quest_id
+    """,
+    "store_products": """
+        SELECT product_id, product_name, product_description,
+               product_category, base_price, product_icon
+        FROM store_products
+        WHERE is_active = TRUE
+        ORDER BY product_category, base_price
+    """,
+    "tier_benefits": """
+        SELECT tier_name, min_streak, max_streak, discount_percentage, tier_color, tier_icon
+        FROM tier_benefits
+        ORDER BY min_streak
+    """,
+}
+
+
+class MemoryBackend:
+    """Process-local key/value store with per-key expiry."""
+
+    shared = False  # other workers see their own copy
+
+    def __init__(self):
+        self._data = {}  # key -> (value, expires_at or None)
+
+    async def get(self, key: str) -> str | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get_many(self, keys: list[str]) -> list[str | None]:
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._data[key] = (str(value), None)
+        return value
+
+    async def close(self):
+        self._data.clear()
+
+
+class RedisBackend:
+    """Shared backend on top of redis.asyncio."""
+
+    shared = True
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> str | None:
+        return await self._redis.get(key)
+
+    async def get_many(self, keys: list[str]) -> list[str | None]:
+        return await self._redis.mget(keys) if keys else []
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        await self._redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def incr(self, key: str) -> int:
+        return await self._redis.incr(key)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def create_cache_backend(url: str | None):
+    """MemoryBackend for an empty or memory:// URL, RedisBackend for redis:// and rediss://."""
+    if not url or url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported CACHE_URL {url!r}; expected memory:// or redis://")
+
+
+def _plain(row: dict) -> dict:
+    # NUMERIC columns arrive as Decimal; store floats so both backends return identical rows
+    return {k: float(v) if isinstance(v, Decimal) else v for k, v in row.items()}
+
+
+class CatalogCache:
+    """
+    Read-through cache of the catalogs in CATALOG_QUERIES.
+
+    Rows are shared between requests: callers must copy a row before changing it.
+    """
+
+    def __init__(self, backend, ttl: float = 300.0, version_check_interval: float = 1.0):
+        self.backend = backend
+        self.ttl = ttl
+        # How long a worker trusts its local copy before re-reading the version
+        # counter; keeps hot reads off the network with a shared backend
+        self.version_check_interval = version_check_interval
+        self._local = {}  # name -> {"rows", "version", "loaded_at", "checked_at"}
+        self.hits = 0
+        self.misses = 0
+
+    async def _version(self, name: str) -> int:
+        return int(await self.backend.get(f"catalog:{name}:version") or 0)
+
+    async def get(self, name: str, get_connection) -> list[dict]:
+        if name not in CATALOG_QUERIES:
+            raise KeyError(f"Unknown catalog {name!r}")
+
+        now = time.monotonic()
+        local = self._local.get(name)
+        if local and now - local["loaded_at"] < self.ttl:
+            if now - local["checked_at"] < self.version_check_interval:
+                self.hits += 1
+                return local["rows"]
+            version = await self._version(name)
+            if version == local["version"]:
+                local["checked_at"] = now
+                self.hits += 1
+                return local["rows"]
+        else:
+            version = await self._version(name)
+
+        self.misses += 1
+        key = f"catalog:{name}:v{version}"
+        cached = await self.backend.get(key)
+        if cached is not None:
+            rows = json.loads(cached)
+        else:
+            async with get_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(CATALOG_QUERIES[name])
+                    rows = [_plain(row) for row in await cur.fetchall()]
+            await self.backend.set(key, json.dumps(rows, default=str), self.ttl)
+
+        self._local[name] = {"rows": rows, "version": version, "loaded_at": now, "checked_at": now}
+        return rows
+
+    async def invalidate(self, name: str | None = None) -> dict:
+        """Bumps the version of one catalog (or all of them); returns the new versions."""
+        names = [name] if name else list(CATALOG_QUERIES)
+        versions = {}
+        for catalog in names:
+            if catalog not in CATALOG_QUERIES:
+                raise KeyError(f"Unknown catalog {catalog!r}")
+            versions[catalog] = await self.backend.incr(f"catalog:{catalog}:version")
+            self._local.pop(catalog, None)
+        return versions
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "catalogs": {name: entry["version"] for name, entry in self._local.items()},
+        }
@@ -95,6 +95,24 @@ CREATE TABLE user_community_quests (
     UNIQUE(user_id, community_quest_id)
 );
 
+-- Weekly leaderboard rollover bookkeeping (see weekly_reset.py)
+CREATE TABLE weekly_rollovers (
+    week_start DATE PRIMARY KEY, -- Monday of the week being closed out
+    status VARCHAR(20) NOT NULL DEFAULT 'started', -- 'started', 'snapshotted', 'bonus_awarded', 'completed'
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Final standings of each closed week
+CREATE TABLE weekly_standings (
+    week_start DATE NOT NULL,
+    user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
+    final_rank INTEGER NOT NULL,
+    weekly_points INTEGER NOT NULL,
+    bonus_awarded INTEGER DEFAULT 0,
+    PRIMARY KEY (week_start, user_id)
+);
+
 -- User Journey / Historical Data Tracking Tables
 
 -- Track points earned per community over time
@@ -161,6 +179,15 @@ CREATE TABLE user_preferences (
     UNIQUE(user_id)
 );
 
+-- Idempotency keys for the bulk endpoints (POST /quests/bulk, POST /user-quests/bulk)
+CREATE TABLE bulk_batches (
+    batch_key VARCHAR(100) PRIMARY KEY, -- chosen by the client, one per logical request
+    endpoint VARCHAR(50) NOT NULL,
+    request_hash CHAR(64) NOT NULL, -- sha256 of the payload; a reused key with another payload is rejected
+    response JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Seed initial data
 -- Current user (user_id will be 1)
 INSERT INTO users (username, email, points, spent_points, weekly_points, streak, last_login) VALUES 
@@ -432,3 +459,190 @@ INSERT INTO tier_benefits (tier_name, min_streak, max_streak, discount_percentag
 ('Gold', 30, 89, 10.00, '#FFD700', '🥇'),
 ('Platinum', 90, 179, 15.00, '#E5E4E2', '💎'),
 ('Diamond', 180, NULL, 20.00, '#B9F2FF', '💠');
+
+-- Secondary indexes for the hot endpoint queries (see migrations/002_hot_query_indexes.sql)
+CREATE INDEX idx_user_quests_user_quest_completed ON user_quests (user_id, quest_id, completed_at DESC);
+CREATE INDEX idx_user_community_quests_user_covering ON user_community_quests (user_id, community_quest_id) INCLUDE (completed_at);
+CREATE INDEX idx_community_quests_active_community_end ON community_quests (community_id, event_end_date) WHERE is_active = TRUE;
+CREATE INDEX idx_user_points_history_user_recorded ON user_points_history (user_id, recorded_at) INCLUDE (total_points);
+CREATE INDEX idx_user_community_points_history_user_community ON user_community_points_history (user_id, community_id) INCLUDE (points_earned);
+CREATE INDEX idx_user_achievements_user_achieved ON user_achievements (user_id, achieved_at DESC);
+CREATE INDEX idx_user_purchases_user_date ON user_purchases (user_id, purchase_date DESC);
+
+-- Quest completion in one round trip (see complete_quest in crud.py).
+-- Locks the user's row first, so concurrent completions by the same user queue
+-- up and can't both pass the duplicate check. status is one of 'completed',
+-- 'quest_not_found', 'user_not_found' or 'already_completed'.
+CREATE OR REPLACE FUNCTION complete_user_quest(
+    p_user_id INTEGER,
+    p_quest_id INTEGER,
+    OUT status TEXT,
+    OUT quest_type VARCHAR,
+    OUT points_added INTEGER,
+    OUT all_daily_complete BOOLEAN,
+    OUT streak_incremented BOOLEAN,
+    OUT username VARCHAR,
+    OUT weekly_points INTEGER,
+    OUT streak INTEGER
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_last_daily_completion DATE;
+    v_period_start TIMESTAMP WITH TIME ZONE;
+BEGIN
+    all_daily_complete := FALSE;
+    streak_incremented := FALSE;
+
+    SELECT q.points_reward, q.quest_type INTO points_added, quest_type
+    FROM quests q
+    WHERE q.quest_id = p_quest_id;
+    IF NOT FOUND THEN
+        status := 'quest_not_found';
+        RETURN;
+    END IF;
+
+    SELECT u.last_daily_completion INTO v_last_daily_completion
+    FROM users u
+    WHERE u.user_id = p_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        status := 'user_not_found';
+        RETURN;
+    END IF;
+
+    -- Daily quests reset at midnight, weekly on Monday, monthly on the 1st
+    v_period_start := CASE quest_type
+        WHEN 'daily' THEN CURRENT_DATE::timestamptz
+        WHEN 'weekly' THEN date_trunc('week', CURRENT_DATE)
+        ELSE date_trunc('month', CURRENT_DATE)
+    END;
+
+    IF EXISTS (
+        SELECT 1 FROM user_quests uq
+        WHERE uq.user_id = p_user_id AND uq.quest_id = p_quest_id AND uq.completed_at >= v_period_start
+    ) THEN
+        status := 'already_completed';
+        RETURN;
+    END IF;
+
+    INSERT INTO user_quests (user_id, quest_id, completed_at)
+    VALUES (p_user_id, p_quest_id, CURRENT_TIMESTAMP);
+
+    -- The streak goes up once per day, when the last active daily quest is done
+    IF quest_type = 'daily' AND v_last_daily_completion IS DISTINCT FROM CURRENT_DATE THEN
+        all_daily_complete := (
+            SELECT COUNT(DISTINCT uq.quest_id)
+            FROM user_quests uq
+            JOIN quests q ON uq.quest_id = q.quest_id
+            WHERE uq.user_id = p_user_id AND q.quest_type = 'daily' AND q.is_active = TRUE
+              AND uq.completed_at >= CURRENT_DATE
+        ) >= (
+            SELECT COUNT(*) FROM quests q WHERE q.quest_type = 'daily' AND q.is_active = TRUE
+        );
+        streak_incremented := all_daily_complete;
+    END IF;
+
+    UPDATE users u
+    SET points = u.points + points_added,
+        weekly_points = u.weekly_points + points_added,
+        streak = u.streak + CASE WHEN streak_incremented THEN 1 ELSE 0 END,
+        last_daily_completion = CASE WHEN streak_incremented THEN CURRENT_DATE ELSE u.last_daily_completion END
+    WHERE u.user_id = p_user_id
+    RETURNING u.username, u.weekly_points, u.streak INTO username, weekly_points, streak;
+
+    status := 'completed';
+END;
+$$ LANGUAGE plpgsql;
+
+-- Per-user counters behind GET /journey/stats, so the endpoint reads one row
+-- instead of counting. Statement-level triggers on the counted tables keep them
+-- current (bulk inserts update each user's row once per statement); users
+-- without a row have all counters at 0. rebuild_user_stats() recomputes them.
+CREATE TABLE user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    communities_joined INTEGER NOT NULL DEFAULT 0,
+    quests_completed INTEGER NOT NULL DEFAULT 0, -- user_quests rows with completed_at set
+    achievements_earned INTEGER NOT NULL DEFAULT 0
+);
+
+-- Trigger function: applies a statement's inserted rows (+1 each) and deleted
+-- rows (-1 each; updates have both) to user_stats column TG_ARGV[0]. Only rows
+-- meeting the condition in TG_ARGV[1] count. Users deleted meanwhile are skipped.
+CREATE OR REPLACE FUNCTION count_user_stats() RETURNS TRIGGER AS $$
+DECLARE
+    v_condition TEXT := COALESCE(TG_ARGV[1], 'TRUE');
+    v_rows TEXT;
+BEGIN
+    v_rows := CASE TG_OP
+        WHEN 'INSERT' THEN format('SELECT user_id, 1 AS delta FROM new_rows WHERE %s', v_condition)
+        WHEN 'DELETE' THEN format('SELECT user_id, -1 AS delta FROM old_rows WHERE %s', v_condition)
+        ELSE format('SELECT user_id, 1 AS delta FROM new_rows WHERE %1$s
+                     UNION ALL SELECT user_id, -1 FROM old_rows WHERE %1$s', v_condition)
+    END;
+    -- In user_id order, so concurrent statements lock users' rows in the same order
+    EXECUTE format(
+        'INSERT INTO user_stats AS s (user_id, %1$I)
+         SELECT d.user_id, SUM(d.delta) FROM (%2$s) d
+         JOIN users u ON u.user_id = d.user_id
+         GROUP BY d.user_id
+         HAVING SUM(d.delta) <> 0
+         ORDER BY d.user_id
+         ON CONFLICT (user_id) DO UPDATE SET %1$I = s.%1$I + EXCLUDED.%1$I',
+        TG_ARGV[0], v_rows
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER user_stats_quests_insert AFTER INSERT ON user_quests
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('quests_completed', 'completed_at IS NOT NULL');
+CREATE TRIGGER user_stats_quests_update AFTER UPDATE ON user_quests
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('quests_completed', 'completed_at IS NOT NULL');
+CREATE TRIGGER user_stats_quests_delete AFTER DELETE ON user_quests
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('quests_completed', 'completed_at IS NOT NULL');
+CREATE TRIGGER user_stats_communities_insert AFTER INSERT ON user_communities
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('communities_joined');
+CREATE TRIGGER user_stats_communities_delete AFTER DELETE ON user_communities
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('communities_joined');
+CREATE TRIGGER user_stats_achievements_insert AFTER INSERT ON user_achievements
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('achievements_earned');
+CREATE TRIGGER user_stats_achievements_delete AFTER DELETE ON user_achievements
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('achievements_earned');
+
+-- Recomputes the counters of users p_from..p_to (all users by default) and
+-- returns how many rows were written. Writes to the counted tables wait until
+-- the calling transaction ends, so run large rebuilds in ranges
+-- (rebuild_user_stats.py does).
+CREATE OR REPLACE FUNCTION rebuild_user_stats(p_from INTEGER DEFAULT NULL, p_to INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    LOCK TABLE user_quests, user_communities, user_achievements IN SHARE MODE;
+
+    INSERT INTO user_stats AS s (user_id, communities_joined, quests_completed, achievements_earned)
+    SELECT u.user_id,
+           (SELECT COUNT(*) FROM user_communities c WHERE c.user_id = u.user_id),
+           (SELECT COUNT(*) FROM user_quests q WHERE q.user_id = u.user_id AND q.completed_at IS NOT NULL),
+           (SELECT COUNT(*) FROM user_achievements a WHERE a.user_id = u.user_id)
+    FROM users u
+    WHERE u.user_id BETWEEN COALESCE(p_from, 0) AND COALESCE(p_to, 2147483647)
+    ORDER BY u.user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET communities_joined = EXCLUDED.communities_joined,
+        quests_completed = EXCLUDED.quests_completed,
+        achievements_earned = EXCLUDED.achievements_earned;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Counters for the sample data above
+SELECT rebuild_user_stats();
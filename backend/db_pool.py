@@ -0,0 +1,306 @@
+"""
+Bounded PostgreSQL connection pool for the StarLife backend.
+Keeps psycopg2 connections open between requests so endpoints don't pay
+a TCP + auth handshake on every call.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class PoolClosed(Exception):
+    """Raised when a connection is requested from a closed pool."""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+
+    - At most `max_size` connections are open at once; callers beyond that
+      wait up to `timeout` seconds and then get PoolTimeout.
+    - Connections idle for longer than `max_idle` seconds (beyond `min_size`)
+      or older than `max_lifetime` seconds are closed and replaced.
+    - On checkout a connection is health-checked: closed connections are always
+      dropped, and connections idle for more than `health_check_after` seconds
+      are probed with `SELECT 1` first.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = 2,
+        max_size: int = 10,
+        timeout: float = 5.0,
+        max_idle: float = 300.0,
+        max_lifetime: float = 3600.0,
+        health_check_after: float = 30.0,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # most recently returned connection on the right
+        self._in_use = {}  # id(conn) -> _PooledConnection
+        self._size = 0  # idle + in use + being opened
+        self._waiting = 0
+        self._closed = False
+
+        # Metrics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._failed_health_checks = 0
+        self._checkout_wait_total = 0.0
+        self._checkout_wait_max = 0.0
+        self._recent_waits = deque(maxlen=1000)
+
+    # --- Lifecycle ---
+
+    def warm(self):
+        """Open connections until the pool holds `min_size` of them."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except psycopg2.Error:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def close(self):
+        """Close idle connections and refuse new checkouts. In-use connections close on return."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled.conn)
+
+    # --- Checkout / return ---
+
+    def getconn(self):
+        """Check out a healthy connection, waiting up to `timeout` seconds for one."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        while True:
+            pooled, create = self._acquire_slot(deadline)
+
+            if create:
+                try:
+                    pooled = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(pooled):
+                self._discard(pooled)
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._in_use[id(pooled.conn)] = pooled
+                self._checkouts += 1
+                self._checkout_wait_total += waited
+                self._checkout_wait_max = max(self._checkout_wait_max, waited)
+                self._recent_waits.append(waited)
+            return pooled.conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection to the pool, or close it if it is broken or `discard` is set."""
+        with self._cond:
+            pooled = self._in_use.pop(id(conn), None)
+        if pooled is None:
+            raise ValueError("Connection does not belong to this pool")
+
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        now = time.monotonic()
+        if discard or conn.closed or self._closed or now - pooled.created_at > self.max_lifetime:
+            self._discard(pooled)
+            return
+
+        pooled.last_used = now
+        with self._cond:
+            self._idle.append(pooled)
+            expired = self._pop_expired_idle(now)
+            self._cond.notify()
+        for stale in expired:
+            self._close_quietly(stale.conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager with the same semantics as the old per-request connection:
+        commit on success, roll back on error.
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception as exc:
+            if isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                discard = True
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    # --- Metrics ---
+
+    def stats(self) -> dict:
+        with self._cond:
+            recent = sorted(self._recent_waits)
+            in_use = len(self._in_use)
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": in_use,
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_discarded": self._discarded,
+                "failed_health_checks": self._failed_health_checks,
+                "checkout_wait_avg_ms": round(1000 * self._checkout_wait_total / self._checkouts, 3) if self._checkouts else 0.0,
+                "checkout_wait_p99_ms": round(1000 * recent[int(0.99 * (len(recent) - 1))], 3) if recent else 0.0,
+                "checkout_wait_max_ms": round(1000 * self._checkout_wait_max, 3),
+            }
+
+    # --- Internals ---
+
+    def _acquire_slot(self, deadline: float):
+        """
+        Returns (pooled_connection, False) for an idle connection, or
+        (None, True) when the caller has reserved a slot to open a new one.
+        """
+        expired = []
+        try:
+            with self._cond:
+                self._waiting += 1
+                try:
+                    while True:
+                        if self._closed:
+                            raise PoolClosed("Connection pool is closed")
+
+                        now = time.monotonic()
+                        while self._idle:
+                            pooled = self._idle.pop()
+                            if now - pooled.created_at > self.max_lifetime:
+                                self._size -= 1
+                                self._discarded += 1
+                                expired.append(pooled)
+                                continue
+                            return pooled, False
+
+                        if self._size < self.max_size:
+                            self._size += 1
+                            return None, True
+
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise PoolTimeout(
+                                f"Timed out after {self.timeout}s waiting for a database connection "
+                                f"(max_size={self.max_size})"
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+        finally:
+            for stale in expired:
+                self._close_quietly(stale.conn)
+
+    def _pop_expired_idle(self, now: float):
+        """Remove connections idle past `max_idle` while keeping at least `min_size` open. Caller holds the lock."""
+        expired = []
+        # Oldest idle connections sit on the left
+        while self._idle and self._size > self.min_size and now - self._idle[0].last_used > self.max_idle:
+            expired.append(self._idle.popleft())
+            self._size -= 1
+            self._discarded += 1
+        return expired
+
+    def _connect(self) -> _PooledConnection:
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created += 1
+        return _PooledConnection(conn)
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        conn = pooled.conn
+        if conn.closed:
+            return False
+        if time.monotonic() - pooled.last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._cond:
+                self._failed_health_checks += 1
+            return False
+
+    def _discard(self, pooled: _PooledConnection):
+        self._close_quietly(pooled.conn)
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
@@ -0,0 +1,93 @@
+"""
+Version-based ETags and conditional GETs for the StarLife API.
+
+Writes bump a change counter for every scope they touch (ChangeTracker.bump),
+e.g. "user:42" once user 42's quest completion has committed. Each GET route
+declares the scopes its response depends on; its ETag is a hash of the
+request URL and those counters, so answering If-None-Match costs one counter
+lookup instead of the endpoint's queries and serialisation:
+
+    @app.get("/user/{user_id}", dependencies=[Depends(conditional_get(changes, "user:{user_id}"))])
+
+Counters are stored in the cache backend (cache.py) next to the catalog
+versions, so "catalog:rewards" is bumped by CatalogCache.invalidate. With the
+in-memory backend counters are per worker, so its ETags include the process id:
+another worker's counters could otherwise match an ETag issued before a write
+it never saw and answer 304 with stale data. A request landing on a different
+worker then gets a full response; set CACHE_URL so all workers share counters
+and ETags.
+"""
+
+import hashlib
+import uuid
+from datetime import datetime
+
+from fastapi import HTTPException, Request, Response
+
+# Makes ETags built from worker-local state (`local`, or counters in a non-shared backend) unique per process
+PROCESS_ID = uuid.uuid4().hex
+
+# Clock components for responses that change with time as well as with writes
+GRANULARITIES = {
+    "day": "%Y-%m-%d",             # daily quest resets, streaks
+    "minute": "%Y-%m-%dT%H:%M",    # event countdowns
+}
+
+
+class ChangeTracker:
+    """Per-scope change counters kept in a cache backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def bump(self, *scopes: str):
+        """Call after the write has committed, so a new ETag never labels old data."""
+        for scope in scopes:
+            await self.backend.incr(f"{scope}:version")
+
+    async def versions(self, scopes: list[str]) -> list[int]:
+        values = await self.backend.get_many([f"{scope}:version" for scope in scopes])
+        return [int(value or 0) for value in values]
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison (RFC 9110 13.1.2): W/ prefixes are ignored
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def conditional_get(tracker: ChangeTracker, *scopes: str, granularity: str | None = None, local=None):
+    """
+    Builds a route dependency that sets the ETag header, or ends the request
+    with 304 Not Modified when If-None-Match already has the current one.
+
+    scopes:      counter names, formatted with the path params ("user:{user_id}")
+    granularity: "day" or "minute" when the response also depends on the clock
+    local:       callable returning a version of worker-local state, e.g. the
+                 in-memory leaderboards
+    """
+    if granularity is not None and granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}")
+    per_process = local is not None or not getattr(tracker.backend, "shared", False)
+
+    async def dependency(request: Request, response: Response):
+        resolved = [scope.format(**request.path_params) for scope in scopes]
+        parts = [request.url.path, request.url.query]
+        parts += [str(version) for version in await tracker.versions(resolved)]
+        if granularity is not None:
+            parts.append(datetime.now().strftime(GRANULARITIES[granularity]))
+        if per_process:
+            parts.append(PROCESS_ID)
+        if local is not None:
+            parts.append(str(local()))
+
+        etag = 'W/"' + hashlib.sha1("|".join(parts).encode()).hexdigest()[:20] + '"'
+        # no-cache: browsers keep the body but revalidate it on every fetch
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _matches(request.headers.get("if-none-match", ""), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
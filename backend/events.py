@@ -0,0 +1,145 @@
+"""
+Server-push events for the StarLife backend.
+
+Write endpoints publish small deltas after they commit (new points and
+streak, leaderboard rank, completed quests, community membership), and
+GET /events/{user_id} streams them to the browser as Server-Sent Events, so
+clients no longer refetch everything after each action.
+
+Fan-out goes through an in-process EventBus. With several uvicorn workers,
+set EVENTS_BRIDGE=postgres: events are then published with NOTIFY and every
+worker LISTENs on the same channel and delivers them to its own subscribers.
+
+Event payloads are JSON: {"user_id": int | None, "event": str, "data": {...}};
+a None user_id goes to every subscriber. Events whose name starts with "_" are
+for the workers themselves (e.g. leaderboard sync): they reach the handlers
+registered with `on` and are never streamed to clients.
+"""
+
+import asyncio
+import json
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventBus:
+    """In-process pub/sub with one bounded queue per open stream."""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.bridge = None  # PostgresBridge when events must reach other workers
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+        self._handlers: dict[str, list] = {}
+
+    def on(self, event: str, handler):
+        """Calls `handler(user_id, data)` for every delivered `event`."""
+        self._handlers.setdefault(event, []).append(handler)
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def deliver(self, user_id: int | None, event: str, data: dict):
+        """Hands an event to this worker's handlers and subscribers."""
+        for handler in self._handlers.get(event, ()):
+            try:
+                handler(user_id, data)
+            except Exception as e:
+                print(f"Event handler for {event} failed: {e}")
+        if event.startswith("_"):
+            return
+        if user_id is None:
+            targets = [q for queues in self._subscribers.values() for q in queues]
+        else:
+            targets = self._subscribers.get(user_id, ())
+        for queue in list(targets):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and tell it to reload instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("resync", {}))
+
+    async def publish(self, user_id: int | None, event: str, data: dict):
+        """Publishes to every worker's subscribers (call after the write has committed)."""
+        if self.bridge is not None:
+            try:
+                await self.bridge.notify(user_id, event, data)
+                return
+            except Exception as e:
+                print(f"Event bridge publish failed, delivering locally only: {e}")
+        self.deliver(user_id, event, data)
+
+    async def stream(self, user_id: int, is_disconnected, heartbeat: float = 15.0):
+        """SSE body for one client; ends when `is_disconnected()` returns True."""
+        queue = self.subscribe(user_id)
+        try:
+            yield format_sse("ready", {"user_id": user_id})
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                    yield format_sse(event, data)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(user_id, queue)
+
+
+class PostgresBridge:
+    """Relays events between workers through Postgres LISTEN/NOTIFY."""
+
+    def __init__(self, dsn: str, bus: EventBus, get_connection, channel: str = "starlife_events",
+                 on_reconnect=None):
+        self.dsn = dsn
+        self.bus = bus
+        self.get_connection = get_connection
+        self.channel = channel
+        self.on_reconnect = on_reconnect  # awaited after a reconnect, to recover missed events
+
+    async def notify(self, user_id: int | None, event: str, data: dict):
+        payload = json.dumps({"user_id": user_id, "event": event, "data": data}, default=str)
+        async with self.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+
+    async def run(self, reconnect_delay: float = 5.0):
+        """Background task: LISTEN on a dedicated connection and deliver to the local bus."""
+        import psycopg
+
+        reconnected = False
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.dsn, autocommit=True) as conn:
+                    await conn.execute(f'LISTEN "{self.channel}"')
+                    if reconnected:
+                        # Notifications sent while we were disconnected are lost
+                        self.bus.deliver(None, "resync", {})
+                        if self.on_reconnect:
+                            await self.on_reconnect()
+                    async for notify in conn.notifies():
+                        message = json.loads(notify.payload)
+                        self.bus.deliver(message["user_id"], message["event"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event bridge disconnected, reconnecting in {reconnect_delay}s: {e}")
+            reconnected = True
+            await asyncio.sleep(reconnect_delay)
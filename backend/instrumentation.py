@@ -0,0 +1,338 @@
+"""
+Request metrics and slow-request profiling for the StarLife backend.
+
+InstrumentationMiddleware times every request per route template and splits
+its time into phases that the code underneath records:
+
+    with timed("db"):
+        await cur.execute(query, params)
+
+Each phase adds its time and call count to the current request (so "db" gives
+DB time and queries per request) and to a per-phase call-duration histogram.
+Time not covered by any phase is reported as "python". Phases that overlap
+inside one request (asyncio.gather) are added up, so "python" is floored at 0.
+
+The metrics are prometheus_client collectors in their own registry;
+metrics.render() exports them for GET /metrics, together with any gauges
+registered with register_gauges().
+
+Streamed responses (SSE, NDJSON) can stay open for hours, so they are timed to
+their first byte and leave the profiler once headers are sent; phase time
+after that only reaches the per-call histograms.
+
+SlowRequestProfiler (opt-in) samples every thread's stack while requests run
+and keeps folded stacks (flamegraph.pl / speedscope input) for requests slower
+than its threshold. Samples are process-wide: a slow request's flame graph
+also shows whatever else kept the event loop busy meanwhile.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+import fastapi.routing
+import prometheus_client
+from fastapi.responses import JSONResponse
+from prometheus_client.core import GaugeMetricFamily
+
+# Seconds, for request and call durations
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Calls per request, e.g. DB queries (an N+1 endpoint lands in the high buckets)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+# Response content types timed to their first byte (see InstrumentationMiddleware)
+STREAMING_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+
+class RequestTimings:
+    """Seconds and calls per phase for one request."""
+
+    __slots__ = ("seconds", "calls")
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+
+
+_current = ContextVar("request_timings", default=None)
+
+
+class StatsCollector:
+    """Collector turning registered stats dicts into gauges on every scrape."""
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.sources = []  # (name, collect, label)
+
+    def collect(self):
+        for name, collect, label in self.sources:
+            stats = collect()
+            families = {}
+            for group, group_stats in (stats.items() if label else [(None, stats)]):
+                for key, value in group_stats.items():
+                    if not isinstance(value, (int, float)):
+                        continue
+                    metric = re.sub(r"\W", "_", f"{self.namespace}_{name}_{key}")
+                    if metric not in families:
+                        families[metric] = GaugeMetricFamily(metric, f"{name} {key}", labels=[label] if label else None)
+                    families[metric].add_metric([str(group)] if label else [], float(value))
+            yield from families.values()
+
+
+class Metrics:
+    def __init__(self, namespace: str = "starlife"):
+        self.registry = prometheus_client.CollectorRegistry()
+        common = {"namespace": namespace, "registry": self.registry}
+        self.requests = prometheus_client.Counter(
+            "http_requests", "Requests by route template and status.", ["method", "route", "status"], **common)
+        self.in_flight = prometheus_client.Gauge("http_requests_in_flight", "Requests being served.", **common)
+        self.streams_open = prometheus_client.Gauge(
+            "http_streams_open", "Streamed responses (SSE, NDJSON) still sending.", **common)
+        self.durations = prometheus_client.Histogram(
+            "http_request_duration_seconds", "Request latency, to the last body byte (first byte for streams).",
+            ["method", "route"], buckets=LATENCY_BUCKETS, **common)
+        self.phase_seconds = prometheus_client.Counter(
+            "http_request_phase_seconds", "Request time per phase (db, serialize, ..., python).",
+            ["method", "route", "phase"], **common)
+        self.phase_calls = prometheus_client.Histogram(
+            "http_request_phase_calls", "Calls per request for requests making any, e.g. DB queries.",
+            ["method", "route", "phase"], buckets=COUNT_BUCKETS, **common)
+        self.calls = prometheus_client.Histogram(
+            "phase_call_duration_seconds", "Duration of single calls, e.g. one DB query.",
+            ["phase"], buckets=LATENCY_BUCKETS, **common)
+        self.stats = StatsCollector(namespace)
+        self.registry.register(self.stats)
+
+    def register_gauges(self, name: str, collect, label: str | None = None):
+        """
+        Exports the numbers in collect()'s dict as gauges named
+        <namespace>_<name>_<key>. With label, collect() returns
+        {label value: stats dict} instead.
+        """
+        self.stats.sources.append((name, collect, label))
+
+    def observe_request(self, method: str, route: str, status: int, timings: RequestTimings, seconds: float):
+        self.requests.labels(method, route, str(status)).inc()
+        self.durations.labels(method, route).observe(seconds)
+        covered = 0.0
+        for phase, phase_seconds in timings.seconds.items():
+            self.phase_seconds.labels(method, route, phase).inc(phase_seconds)
+            self.phase_calls.labels(method, route, phase).observe(timings.calls[phase])
+            covered += phase_seconds
+        self.phase_seconds.labels(method, route, "python").inc(max(seconds - covered, 0.0))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return prometheus_client.generate_latest(self.registry).decode()
+
+
+metrics = Metrics()
+
+
+def record(phase: str, seconds: float, calls: int = 1):
+    """
+    Adds finished calls to the phase's histogram and to the current request,
+    if any. calls=0 only adds time (e.g. fetching rows of a counted query).
+    """
+    if calls:
+        metrics.calls.labels(phase).observe(seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings.seconds[phase] = timings.seconds.get(phase, 0.0) + seconds
+        timings.calls[phase] = timings.calls.get(phase, 0) + calls
+
+
+class timed:
+    """Context manager recording the time spent in its block in `phase` (see record)."""
+
+    __slots__ = ("phase", "calls", "started")
+
+    def __init__(self, phase: str, calls: int = 1):
+        self.phase = phase
+        self.calls = calls
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.phase, time.perf_counter() - self.started, self.calls)
+
+
+_serialize_response = fastapi.routing.serialize_response
+
+
+async def _timed_serialize_response(*args, **kwargs):
+    with timed("serialize"):
+        return await _serialize_response(*args, **kwargs)
+
+
+def instrument_serialization():
+    """
+    Times response_model validation and encoding as "serialize". FastAPI has
+    no hook for it, so this wraps fastapi.routing.serialize_response.
+    """
+    fastapi.routing.serialize_response = _timed_serialize_response
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse whose json.dumps is timed as "serialize"; use as default_response_class."""
+
+    def render(self, content) -> bytes:
+        with timed("serialize"):
+            return super().render(content)
+
+
+# Innermost frames of threads that are only waiting (event loop in select, idle workers)
+IDLE_FRAMES = {("select", "selectors.py"), ("wait", "threading.py"), ("_worker", "thread.py")}
+
+
+def fold_stack(frame) -> str | None:
+    """Frame chain as "outer;...;inner", or None for an idle thread."""
+    code = frame.f_code
+    if (code.co_name, os.path.basename(code.co_filename)) in IDLE_FRAMES:
+        return None
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """
+    threshold_ms:   requests at least this slow keep a profile
+    interval_ms:    time between stack samples
+    max_profiles:   profiles kept, oldest dropped first
+    window_seconds: samples kept; requests longer than this lose their oldest samples
+    """
+
+    def __init__(self, threshold_ms: float, interval_ms: float = 5.0, max_profiles: int = 50,
+                 window_seconds: float = 60.0):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.samples = deque(maxlen=max(int(window_seconds / self.interval), 1))  # (monotonic time, folded stack)
+        self.profiles = deque(maxlen=max_profiles)
+        self.next_id = 1
+        self.active = 0
+        self.busy = threading.Event()
+        self.thread = None
+
+    def begin(self) -> float:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._sample, name="slow-request-profiler", daemon=True)
+            self.thread.start()
+        self.active += 1
+        self.busy.set()
+        return time.monotonic()
+
+    def end(self, started: float, method: str, route: str, path: str, status: int, seconds: float):
+        self.active -= 1
+        if not self.active:
+            self.busy.clear()
+        if seconds < self.threshold:
+            return
+        stacks = Counter(stack for at, stack in list(self.samples) if at >= started)
+        self.profiles.append({
+            "id": self.next_id,
+            "method": method,
+            "route": route,
+            "path": path,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 1),
+            "at": time.time(),
+            "samples": sum(stacks.values()),
+            "stacks": dict(stacks.most_common()),
+        })
+        self.next_id += 1
+
+    def _sample(self):
+        own = threading.get_ident()
+        while True:
+            self.busy.wait()
+            time.sleep(self.interval)
+            now = time.monotonic()
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    stack = fold_stack(frame)
+                    if stack:
+                        self.samples.append((now, stack))
+
+    def summaries(self) -> list[dict]:
+        """Kept profiles, newest first, without their stacks."""
+        return [{key: value for key, value in profile.items() if key != "stacks"}
+                for profile in reversed(self.profiles)]
+
+    def folded(self, profile_id: int) -> str | None:
+        """A profile as folded stacks ("frame;frame;frame count" lines), or None if gone."""
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].items())
+        return None
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware recording every HTTP request in `metrics` (and in the
+    profiler, if given). Streamed responses are timed to their first byte.
+    """
+
+    def __init__(self, app, profiler: SlowRequestProfiler | None = None):
+        self.app = app
+        self.profiler = profiler
+        self.routes = None  # endpoint -> route template
+
+    def route(self, scope) -> str:
+        # The router stores the matched endpoint in the scope; templates keep label values bounded
+        endpoint = scope.get("endpoint")
+        if self.routes is None and "app" in scope:
+            self.routes = {getattr(route, "endpoint", None): route.path for route in scope["app"].routes}
+        return (self.routes or {}).get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        streaming = False
+        finished = False
+
+        def finish(seconds: float):
+            nonlocal finished
+            finished = True
+            metrics.in_flight.dec()
+            route = self.route(scope)
+            metrics.observe_request(scope["method"], route, status, timings, seconds)
+            if self.profiler:
+                self.profiler.end(profile_started, scope["method"], route, scope["path"], status, seconds)
+
+        async def send_with_status(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", ())).get(b"content-type", b"")
+                if content_type.startswith(STREAMING_TYPES):
+                    # A stream's duration is its client's session; record time to first byte instead
+                    streaming = True
+                    metrics.streams_open.inc()
+                    finish(time.perf_counter() - started)
+            await send(message)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        metrics.in_flight.inc()
+        profile_started = self.profiler.begin() if self.profiler else None
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            if streaming:
+                metrics.streams_open.dec()
+            if not finished:
+                finish(time.perf_counter() - started)
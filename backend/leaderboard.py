@@ -0,0 +1,221 @@
+"""
+In-memory weekly leaderboards for the StarLife backend.
+
+Standings are loaded from the users table once, then kept current by the
+endpoints that change weekly_points or streaks, so /leaderboard and rank
+lookups never scan `users`. Each board is a sorted list keyed on
+(-weekly_points, user_id): top-N is a slice and a user's rank is a
+binary search, both O(log n).
+
+With several workers, each change is also sent to the other workers as an
+incremental message over the events bridge (see crud.py). A full reload is
+only a rare safety net, and its rebuild runs in the threadpool.
+"""
+
+import asyncio
+
+from sortedcontainers import SortedList
+from starlette.concurrency import run_in_threadpool
+
+# Registry methods that may be replayed from another worker's message
+SYNCED_METHODS = ("update_user", "join_community", "leave_community")
+
+
+class Leaderboard:
+    """Sorted standings for one set of users (everyone, or one community)."""
+
+    def __init__(self):
+        self._entries = {}  # user_id -> {"user_id", "username", "weekly_points", "streak"}
+        self._order = SortedList()  # (-weekly_points, user_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def get(self, user_id: int) -> dict | None:
+        entry = self._entries.get(user_id)
+        return dict(entry) if entry else None
+
+    def upsert(self, user_id: int, username: str, weekly_points: int, streak: int):
+        old = self._entries.get(user_id)
+        if old is not None:
+            self._order.remove((-old["weekly_points"], user_id))
+        self._entries[user_id] = {
+            "user_id": user_id,
+            "username": username,
+            "weekly_points": weekly_points,
+            "streak": streak,
+        }
+        self._order.add((-weekly_points, user_id))
+
+    def remove(self, user_id: int):
+        old = self._entries.pop(user_id, None)
+        if old is not None:
+            self._order.remove((-old["weekly_points"], user_id))
+
+    def top(self, n: int) -> list[dict]:
+        return [dict(self._entries[user_id]) for _, user_id in self._order[:n]]
+
+    def rank(self, user_id: int) -> int | None:
+        """1-based position of the user, or None if they aren't on this board."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return self._order.index((-entry["weekly_points"], user_id)) + 1
+
+    def around(self, user_id: int, neighbours: int) -> dict | None:
+        """The user's rank plus up to `neighbours` users directly above and below them."""
+        rank = self.rank(user_id)
+        if rank is None:
+            return None
+        idx = rank - 1
+        above = self._order[max(0, idx - neighbours):idx]
+        below = self._order[idx + 1:idx + 1 + neighbours]
+        return {
+            **self._entries[user_id],
+            "rank": rank,
+            "total_users": len(self),
+            "above": [dict(self._entries[uid]) for _, uid in above],
+            "below": [dict(self._entries[uid]) for _, uid in below],
+        }
+
+
+class LeaderboardRegistry:
+    """
+    The global leaderboard plus one per community.
+
+    Every uvicorn worker keeps its own copy. Writes handled by other workers
+    arrive through `apply`; `run_refresh` reloads from the database now and then
+    to repair anything a lost message left behind.
+    """
+
+    def __init__(self):
+        self.global_board = Leaderboard()
+        self.communities: dict[int, Leaderboard] = {}
+        self._memberships: dict[int, set[int]] = {}  # user_id -> community_ids
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._pending: list[tuple] | None = None  # updates that arrive while a reload is in flight
+        self.version = 0  # bumped on every change; used for ETags
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def load(self, get_connection):
+        """Rebuilds every board from `users` and `user_communities`."""
+        async with self._load_lock:
+            self._pending = []
+            try:
+                async with get_connection() as conn:
+                    async with conn.cursor() as cur:
+                        await cur.execute("SELECT user_id, username, weekly_points, streak FROM users")
+                        users = await cur.fetchall()
+                        await cur.execute("SELECT user_id, community_id FROM user_communities")
+                        memberships = await cur.fetchall()
+
+                # Building the boards takes seconds for large user counts; keep it off the event loop
+                global_board, communities, user_communities, unchanged = await run_in_threadpool(
+                    self._build, users, memberships
+                )
+
+                self.global_board = global_board
+                self.communities = communities
+                self._memberships = user_communities
+                self._loaded = True
+                # Writes during the rebuild may have raced the comparison; treat them as a change
+                if not unchanged or self._pending:
+                    self.version += 1
+
+                # Replay writes made by this worker while the snapshot was being read
+                pending, self._pending = self._pending, None
+                for method, args in pending:
+                    getattr(self, method)(*args)
+            finally:
+                self._pending = None
+
+    def _build(self, users, memberships):
+        """New boards from query rows, and whether they match the current ones."""
+        global_board = Leaderboard()
+        for row in users:
+            global_board.upsert(row["user_id"], row["username"], row["weekly_points"] or 0, row["streak"] or 0)
+
+        communities: dict[int, Leaderboard] = {}
+        user_communities: dict[int, set[int]] = {}
+        for row in memberships:
+            entry = global_board.get(row["user_id"])
+            if entry is None:
+                continue
+            board = communities.setdefault(row["community_id"], Leaderboard())
+            board.upsert(**entry)
+            user_communities.setdefault(row["user_id"], set()).add(row["community_id"])
+
+        try:
+            unchanged = (
+                self._loaded
+                and global_board._entries == self.global_board._entries
+                and user_communities == self._memberships
+            )
+        except RuntimeError:
+            # The current boards changed mid-comparison
+            unchanged = False
+        return global_board, communities, user_communities, unchanged
+
+    async def ensure_loaded(self, get_connection):
+        if not self._loaded:
+            await self.load(get_connection)
+
+    async def run_refresh(self, get_connection, interval: float):
+        """Background task: load the boards, then reload them every `interval` seconds."""
+        while True:
+            try:
+                await self.load(get_connection)
+            except Exception as e:
+                print(f"Leaderboard refresh failed: {e}")
+            await asyncio.sleep(interval)
+
+    def apply(self, method: str, args: list):
+        """Replays a change another worker made (see SYNCED_METHODS)."""
+        if method not in SYNCED_METHODS:
+            raise ValueError(f"Unknown leaderboard method: {method}")
+        getattr(self, method)(*args)
+
+    # --- Incremental updates (call after the write has committed) ---
+
+    def update_user(self, user_id: int, username: str, weekly_points: int, streak: int):
+        if self._pending is not None:
+            self._pending.append(("update_user", (user_id, username, weekly_points, streak)))
+        entry = {"user_id": user_id, "username": username, "weekly_points": weekly_points, "streak": streak}
+        if self.global_board.get(user_id) == entry:
+            return
+        self.version += 1
+        self.global_board.upsert(user_id, username, weekly_points, streak)
+        for community_id in self._memberships.get(user_id, ()):
+            self.communities.setdefault(community_id, Leaderboard()).upsert(user_id, username, weekly_points, streak)
+
+    def join_community(self, user_id: int, community_id: int):
+        if self._pending is not None:
+            self._pending.append(("join_community", (user_id, community_id)))
+        self.version += 1
+        self._memberships.setdefault(user_id, set()).add(community_id)
+        entry = self.global_board.get(user_id)
+        if entry is not None:
+            self.communities.setdefault(community_id, Leaderboard()).upsert(**entry)
+
+    def leave_community(self, user_id: int, community_id: int):
+        if self._pending is not None:
+            self._pending.append(("leave_community", (user_id, community_id)))
+        self.version += 1
+        self._memberships.get(user_id, set()).discard(community_id)
+        board = self.communities.get(community_id)
+        if board is not None:
+            board.remove(user_id)
+
+    # --- Reads ---
+
+    def board(self, community_id: int | None = None) -> Leaderboard | None:
+        if community_id is None:
+            return self.global_board
+        return self.communities.get(community_id)
@@ -0,0 +1,399 @@
+"""
+Load-testing and benchmark harness for the StarLife backend (crud.py) and the
+AI trainer (AI/fitness_trainer.py).
+
+Simulated users run scenarios the way the frontend issues them:
+- dashboard:      GET /dashboard/{user_id}
+- journey:        GET /journey/{user_id}, the Journey page's one read
+- complete_quest: POST /quests/complete/{user_id}/{quest_id}
+- store:          products, tier and purchases, then a purchase
+- leaderboard:    GET /leaderboard and the user's rank
+- chat:           POST /chat on the AI trainer
+
+A mix weights the scenarios. Arrivals are either
+- closed loop: --concurrency users, each starting its next scenario when the
+  last one ends (plus optional think time), or
+- open loop: scenarios arrive as a Poisson process at --rate per second, at
+  most --concurrency in flight (the rest count as dropped). Scenario latency
+  is measured from the scheduled arrival, so server stalls show up as
+  queueing instead of being hidden (coordinated omission).
+
+Scenario choice, user ids and think times come from --seed, so runs are
+repeatable. --seed-users seeds the database with synthetic_data.py first.
+The report has throughput and p50/p95/p99 latency per endpoint and per
+scenario, and is written as JSON (--report) for diffing with --compare.
+
+Usage:
+    python load_test.py --database-url postgresql://... --seed-users 100000 --days 365
+    python load_test.py --mix default --concurrency 50 --duration 60 --report release-1.json
+    python load_test.py --arrival open --rate 200 --duration 60 --report release-2.json
+    python load_test.py --compare release-1.json release-2.json --max-regression 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+SCENARIOS = ("dashboard", "journey", "complete_quest", "store", "leaderboard", "chat")
+# Scenarios that pick from the quest and product ids read by Session.discover
+DISCOVERY_SCENARIOS = ("complete_quest", "store")
+
+MIXES = {
+    "default": {"dashboard": 40, "journey": 15, "complete_quest": 20, "store": 10, "leaderboard": 10, "chat": 5},
+    "backend": {"dashboard": 45, "journey": 15, "complete_quest": 20, "store": 10, "leaderboard": 10},
+    "reads": {"dashboard": 60, "journey": 25, "leaderboard": 15},
+    "writes": {"complete_quest": 70, "store": 30},
+    "chat": {"chat": 100},
+}
+
+CHAT_MESSAGES = [
+    "I'm feeling tired today, should I skip my workout?",
+    "What's a good quick 15-minute workout?",
+    "How do I get back on track after missing a week?",
+    "Any tips for walking more during a work day?",
+    "I hit my step goal! What next?",
+]
+
+# What the Journey page asks for: three years at monthly resolution
+JOURNEY_PARAMS = {"resolution": "month", "health_metrics": "weight_kg,sleep_hours,water_intake_ml,steps"}
+JOURNEY_DAYS = 3 * 365
+
+
+def percentile(ordered: list[float], q: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class Recorder:
+    """Latencies and statuses per endpoint and per scenario, after the warmup."""
+
+    def __init__(self):
+        self.measure_from = 0.0
+        self.endpoints = {}  # name -> {"latencies": [...], "statuses": {...}}
+        self.scenarios = {}
+        self.dropped = 0
+
+    def _add(self, table: dict, name: str, started: float, status):
+        if started < self.measure_from:
+            return
+        entry = table.setdefault(name, {"latencies": [], "statuses": {}})
+        entry["latencies"].append((time.monotonic() - started) * 1000)
+        entry["statuses"][str(status)] = entry["statuses"].get(str(status), 0) + 1
+
+    def endpoint(self, name: str, started: float, status):
+        self._add(self.endpoints, name, started, status)
+
+    def scenario(self, name: str, started: float, status):
+        self._add(self.scenarios, name, started, status)
+
+    @staticmethod
+    def summary(entry: dict, seconds: float) -> dict:
+        ordered = sorted(entry["latencies"])
+        # 4xx are expected outcomes (quest already completed, not enough points)
+        errors = sum(count for status, count in entry["statuses"].items()
+                     if not status.isdigit() or int(status) >= 500)
+        return {
+            "count": len(ordered),
+            "throughput_rps": round(len(ordered) / seconds, 2) if seconds else None,
+            "errors": errors,
+            "statuses": dict(sorted(entry["statuses"].items())),
+            "latency_ms": {
+                "mean": round(sum(ordered) / len(ordered), 2) if ordered else None,
+                "p50": round(percentile(ordered, 0.50), 2) if ordered else None,
+                "p95": round(percentile(ordered, 0.95), 2) if ordered else None,
+                "p99": round(percentile(ordered, 0.99), 2) if ordered else None,
+                "max": round(ordered[-1], 2) if ordered else None,
+            },
+        }
+
+
+class Session:
+    """Runs scenarios against the services and records every request."""
+
+    def __init__(self, client: httpx.AsyncClient, backend_url: str, ai_url: str, recorder: Recorder):
+        self.client = client
+        self.backend_url = backend_url
+        self.ai_url = ai_url
+        self.recorder = recorder
+        self.quest_ids = []
+        self.product_ids = []
+
+    async def request(self, name: str, method: str, url: str, **kwargs):
+        started = time.monotonic()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.endpoint(name, started, type(e).__name__)
+            raise
+        self.recorder.endpoint(name, started, response.status_code)
+        return response
+
+    async def discover(self, user_id: int):
+        """Quest and product ids to pick from, read through the API like the frontend does."""
+        quests = await self.client.get(f"{self.backend_url}/quests/{user_id}")
+        products = await self.client.get(f"{self.backend_url}/store/products/{user_id}")
+        quests.raise_for_status()
+        products.raise_for_status()
+        self.quest_ids = [quest["quest_id"] for quest in quests.json()]
+        self.product_ids = [product["product_id"] for product in products.json()]
+
+    async def dashboard(self, rng: random.Random, user_id: int):
+        return await self.request("GET /dashboard/{user_id}", "GET", f"{self.backend_url}/dashboard/{user_id}")
+
+    async def journey(self, rng: random.Random, user_id: int):
+        start = (datetime.now().date() - timedelta(days=JOURNEY_DAYS)).isoformat()
+        return await self.request(
+            "GET /journey/{user_id}", "GET", f"{self.backend_url}/journey/{user_id}",
+            params={**JOURNEY_PARAMS, "from": start},
+        )
+
+    async def complete_quest(self, rng: random.Random, user_id: int):
+        quest_id = rng.choice(self.quest_ids)
+        return await self.request(
+            "POST /quests/complete/{user_id}/{quest_id}", "POST",
+            f"{self.backend_url}/quests/complete/{user_id}/{quest_id}"
+        )
+
+    async def store(self, rng: random.Random, user_id: int):
+        await asyncio.gather(
+            self.request("GET /store/products/{user_id}", "GET", f"{self.backend_url}/store/products/{user_id}"),
+            self.request("GET /user/{user_id}/tier", "GET", f"{self.backend_url}/user/{user_id}/tier"),
+            self.request("GET /user/{user_id}/purchases", "GET", f"{self.backend_url}/user/{user_id}/purchases"),
+        )
+        return await self.request(
+            "POST /store/purchase/{user_id}", "POST", f"{self.backend_url}/store/purchase/{user_id}",
+            json={"product_id": rng.choice(self.product_ids)}
+        )
+
+    async def leaderboard(self, rng: random.Random, user_id: int):
+        responses = await asyncio.gather(
+            self.request("GET /leaderboard", "GET", f"{self.backend_url}/leaderboard"),
+            self.request("GET /leaderboard/rank/{user_id}", "GET", f"{self.backend_url}/leaderboard/rank/{user_id}"),
+        )
+        return max(responses, key=lambda r: r.status_code)
+
+    async def chat(self, rng: random.Random, user_id: int):
+        return await self.request(
+            "POST /chat", "POST", f"{self.ai_url}/chat",
+            json={"user_id": user_id, "message": rng.choice(CHAT_MESSAGES)}
+        )
+
+    async def run(self, scenario: str, rng: random.Random, user_id: int, started: float | None = None):
+        """One scenario; started is its scheduled arrival in the open-loop model."""
+        started = started or time.monotonic()
+        try:
+            status = (await getattr(self, scenario)(rng, user_id)).status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.recorder.scenario(scenario, started, status)
+
+
+def parse_mix(spec: str) -> dict:
+    """A MIXES name or "scenario=weight,..."."""
+    if spec in MIXES:
+        return MIXES[spec]
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name.strip()!r}; use {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def closed_loop(session: Session, mix: dict, users: tuple, args, deadline: float):
+    async def worker(index: int):
+        rng = random.Random(f"{args.seed}-{index}")
+        while time.monotonic() < deadline:
+            scenario = rng.choices(list(mix), weights=list(mix.values()))[0]
+            await session.run(scenario, rng, rng.randint(*users))
+            if args.think_ms:
+                await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+    await asyncio.gather(*[worker(i) for i in range(args.concurrency)])
+
+
+async def open_loop(session: Session, mix: dict, users: tuple, args, deadline: float):
+    rng = random.Random(args.seed)
+    in_flight = set()
+    next_arrival = time.monotonic()
+    while next_arrival < deadline:
+        await asyncio.sleep(max(next_arrival - time.monotonic(), 0))
+        scenario = rng.choices(list(mix), weights=list(mix.values()))[0]
+        user_id = rng.randint(*users)
+        if len(in_flight) >= args.concurrency:
+            if next_arrival >= session.recorder.measure_from:
+                session.recorder.dropped += 1
+        else:
+            task = asyncio.create_task(session.run(scenario, random.Random(rng.random()), user_id, next_arrival))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_arrival += rng.expovariate(args.rate)
+    await asyncio.gather(*in_flight)
+
+
+def user_range(args) -> tuple:
+    if args.users:
+        low, _, high = args.users.partition("-")
+        return int(low), int(high or low)
+    if args.database_url:
+        import psycopg2
+
+        with psycopg2.connect(args.database_url) as conn, conn.cursor() as cur:
+            cur.execute("SELECT MIN(user_id), MAX(user_id) FROM users")
+            return cur.fetchone()
+    return 1, 10
+
+
+async def run_load(args) -> dict:
+    mix = parse_mix(args.mix)
+    users = user_range(args)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency * 5, max_keepalive_connections=args.concurrency * 5)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        session = Session(client, args.backend_url.rstrip("/"), args.ai_url.rstrip("/"), recorder)
+        if any(mix.get(name) for name in DISCOVERY_SCENARIOS):
+            try:
+                await session.discover(users[0])
+            except httpx.HTTPError as e:
+                raise SystemExit(f"❌ Could not read quests and products from {args.backend_url}: "
+                                 f"{e or type(e).__name__}")
+
+        started_at = datetime.now().isoformat()
+        start = time.monotonic()
+        recorder.measure_from = start + args.warmup
+        deadline = recorder.measure_from + args.duration
+        if args.arrival == "open":
+            await open_loop(session, mix, users, args, deadline)
+        else:
+            await closed_loop(session, mix, users, args, deadline)
+        # Scenarios still running at the deadline finish and count
+        seconds = time.monotonic() - recorder.measure_from
+
+    endpoints = {name: Recorder.summary(entry, seconds) for name, entry in sorted(recorder.endpoints.items())}
+    scenarios = {name: Recorder.summary(entry, seconds) for name, entry in sorted(recorder.scenarios.items())}
+    return {
+        "config": {
+            "backend_url": args.backend_url, "ai_url": args.ai_url, "mix": mix, "arrival": args.arrival,
+            "concurrency": args.concurrency, "rate": args.rate if args.arrival == "open" else None,
+            "think_ms": args.think_ms, "duration": args.duration, "warmup": args.warmup,
+            "seed": args.seed, "users": list(users),
+        },
+        "started_at": started_at,
+        "measured_seconds": round(seconds, 2),
+        "totals": {
+            "requests": sum(e["count"] for e in endpoints.values()),
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "throughput_rps": round(sum(e["count"] for e in endpoints.values()) / seconds, 2),
+            "scenarios": sum(s["count"] for s in scenarios.values()),
+            "dropped": recorder.dropped,
+        },
+        "endpoints": endpoints,
+        "scenarios": scenarios,
+    }
+
+
+def print_table(report: dict):
+    print(f"{'endpoint':<48} {'count':>7} {'rps':>8} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for section in ("endpoints", "scenarios"):
+        for name, s in report[section].items():
+            label = name if section == "endpoints" else f"[{name}]"
+            lat = s["latency_ms"]
+            print(f"{label:<48} {s['count']:>7} {s['throughput_rps']:>8} {s['errors']:>5} "
+                  f"{lat['p50']:>8} {lat['p95']:>8} {lat['p99']:>8}")
+    totals = report["totals"]
+    print(f"\n{totals['requests']} requests, {totals['throughput_rps']} req/s, {totals['errors']} errors, "
+          f"{totals['dropped']} dropped arrivals in {report['measured_seconds']}s")
+
+
+def compare(base_path: str, new_path: str, max_regression: float | None) -> int:
+    """Prints p95 and throughput changes per endpoint; 1 if a p95 regressed past max_regression %."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    regressions = []
+    print(f"{'endpoint':<48} {'p95 base':>9} {'p95 new':>9} {'change':>8} {'rps base':>9} {'rps new':>9}")
+    for section in ("endpoints", "scenarios"):
+        for name in sorted(set(base[section]) | set(new[section])):
+            old, cur = base[section].get(name), new[section].get(name)
+            old_p95 = old["latency_ms"]["p95"] if old else None
+            new_p95 = cur["latency_ms"]["p95"] if cur else None
+            change = None
+            if old_p95 and new_p95 is not None:
+                change = (new_p95 - old_p95) / old_p95 * 100
+                if max_regression is not None and change > max_regression:
+                    regressions.append(name)
+            label = name if section == "endpoints" else f"[{name}]"
+            print(f"{label:<48} {str(old_p95):>9} {str(new_p95):>9} "
+                  f"{(f'{change:+.1f}%' if change is not None else '-'):>8} "
+                  f"{str(old['throughput_rps'] if old else None):>9} {str(cur['throughput_rps'] if cur else None):>9}")
+    if regressions:
+        print(f"\n❌ p95 regressed more than {max_regression:g}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the StarLife backend and AI trainer")
+    parser.add_argument("--backend-url", default=os.getenv("BACKEND_SERVICE_URL", "http://localhost:8000"))
+    parser.add_argument("--ai-url", default=os.getenv("AI_SERVICE_URL", "http://localhost:8001"))
+    parser.add_argument("--mix", default="default", help=f"one of {', '.join(MIXES)} or scenario=weight,...")
+    parser.add_argument("--arrival", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=20, help="closed: simulated users; open: max in flight")
+    parser.add_argument("--rate", type=float, default=50, help="open loop: scenario arrivals per second")
+    parser.add_argument("--think-ms", type=float, default=0, help="closed loop: mean pause between scenarios")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout in seconds")
+    parser.add_argument("--users", help="user id range LOW-HIGH (default: all users in --database-url)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--report", help="write the JSON report here")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--seed-users", type=int, default=0, help="seed this many synthetic users first")
+    parser.add_argument("--days", type=int, default=90, help="days of history per seeded user")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two reports instead of running")
+    parser.add_argument("--max-regression", type=float, help="with --compare: fail if a p95 grew by more %%")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.max_regression))
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.seed_users:
+        if not args.database_url:
+            parser.error("--seed-users needs --database-url or DATABASE_URL")
+        import psycopg2
+        import synthetic_data
+
+        conn = psycopg2.connect(args.database_url)
+        try:
+            result = synthetic_data.generate(conn, args.seed_users, args.days, args.seed)
+        finally:
+            conn.close()
+        print(f"✅ Seeded {result['users']} users with {result['days']} days of history in {result['seconds']}s")
+        if not args.duration:
+            return
+
+    report = asyncio.run(run_load(args))
+    print_table(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
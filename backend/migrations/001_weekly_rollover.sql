@@ -0,0 +1,18 @@
+-- Weekly leaderboard rollover bookkeeping (see weekly_reset.py)
+
+CREATE TABLE IF NOT EXISTS weekly_rollovers (
+    week_start DATE PRIMARY KEY, -- Monday of the week being closed out
+    status VARCHAR(20) NOT NULL DEFAULT 'started', -- 'started', 'snapshotted', 'bonus_awarded', 'completed'
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Final standings of each closed week
+CREATE TABLE IF NOT EXISTS weekly_standings (
+    week_start DATE NOT NULL,
+    user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
+    final_rank INTEGER NOT NULL,
+    weekly_points INTEGER NOT NULL,
+    bonus_awarded INTEGER DEFAULT 0,
+    PRIMARY KEY (week_start, user_id)
+);
@@ -0,0 +1,37 @@
+-- Secondary indexes for the hot endpoint queries in crud.py.
+-- CONCURRENTLY avoids blocking writes on a live database; run this file with
+-- plain psql (not inside a transaction). query_plan_check.py verifies the plans.
+--
+-- users(weekly_points) is deliberately not indexed: weekly_points changes on
+-- every quest completion, and an index on it would turn those into non-HOT
+-- updates. Leaderboard reads are served from memory (leaderboard.py) instead.
+
+-- get_user_quests (latest completion per quest), complete_quest duplicate check
+-- and daily completion count, journey stats quest count
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_quests_user_quest_completed
+    ON user_quests (user_id, quest_id, completed_at DESC);
+
+-- get_community_quests: completion flag per event without visiting the heap
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_community_quests_user_covering
+    ON user_community_quests (user_id, community_quest_id) INCLUDE (completed_at);
+
+-- get_community_quests: upcoming/current events of the user's communities
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_community_quests_active_community_end
+    ON community_quests (community_id, event_end_date)
+    WHERE is_active = TRUE;
+
+-- get_points_timeline
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_points_history_user_recorded
+    ON user_points_history (user_id, recorded_at) INCLUDE (total_points);
+
+-- get_community_points_breakdown
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_community_points_history_user_community
+    ON user_community_points_history (user_id, community_id) INCLUDE (points_earned);
+
+-- get_achievements, journey stats achievement count
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_achievements_user_achieved
+    ON user_achievements (user_id, achieved_at DESC);
+
+-- get_user_purchases
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_purchases_user_date
+    ON user_purchases (user_id, purchase_date DESC);
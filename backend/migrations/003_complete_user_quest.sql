@@ -0,0 +1,84 @@
+-- Quest completion in one round trip (see complete_quest in crud.py).
+-- Locks the user's row first, so concurrent completions by the same user queue
+-- up and can't both pass the duplicate check. status is one of 'completed',
+-- 'quest_not_found', 'user_not_found' or 'already_completed'.
+CREATE OR REPLACE FUNCTION complete_user_quest(
+    p_user_id INTEGER,
+    p_quest_id INTEGER,
+    OUT status TEXT,
+    OUT quest_type VARCHAR,
+    OUT points_added INTEGER,
+    OUT all_daily_complete BOOLEAN,
+    OUT streak_incremented BOOLEAN,
+    OUT username VARCHAR,
+    OUT weekly_points INTEGER,
+    OUT streak INTEGER
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_last_daily_completion DATE;
+    v_period_start TIMESTAMP WITH TIME ZONE;
+BEGIN
+    all_daily_complete := FALSE;
+    streak_incremented := FALSE;
+
+    SELECT q.points_reward, q.quest_type INTO points_added, quest_type
+    FROM quests q
+    WHERE q.quest_id = p_quest_id;
+    IF NOT FOUND THEN
+        status := 'quest_not_found';
+        RETURN;
+    END IF;
+
+    SELECT u.last_daily_completion INTO v_last_daily_completion
+    FROM users u
+    WHERE u.user_id = p_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        status := 'user_not_found';
+        RETURN;
+    END IF;
+
+    -- Daily quests reset at midnight, weekly on Monday, monthly on the 1st
+    v_period_start := CASE quest_type
+        WHEN 'daily' THEN CURRENT_DATE::timestamptz
+        WHEN 'weekly' THEN date_trunc('week', CURRENT_DATE)
+        ELSE date_trunc('month', CURRENT_DATE)
+    END;
+
+    IF EXISTS (
+        SELECT 1 FROM user_quests uq
+        WHERE uq.user_id = p_user_id AND uq.quest_id = p_quest_id AND uq.completed_at >= v_period_start
+    ) THEN
+        status := 'already_completed';
+        RETURN;
+    END IF;
+
+    INSERT INTO user_quests (user_id, quest_id, completed_at)
+    VALUES (p_user_id, p_quest_id, CURRENT_TIMESTAMP);
+
+    -- The streak goes up once per day, when the last active daily quest is done
+    IF quest_type = 'daily' AND v_last_daily_completion IS DISTINCT FROM CURRENT_DATE THEN
+        all_daily_complete := (
+            SELECT COUNT(DISTINCT uq.quest_id)
+            FROM user_quests uq
+            JOIN quests q ON uq.quest_id = q.quest_id
+            WHERE uq.user_id = p_user_id AND q.quest_type = 'daily' AND q.is_active = TRUE
+              AND uq.completed_at >= CURRENT_DATE
+        ) >= (
+            SELECT COUNT(*) FROM quests q WHERE q.quest_type = 'daily' AND q.is_active = TRUE
+        );
+        streak_incremented := all_daily_complete;
+    END IF;
+
+    UPDATE users u
+    SET points = u.points + points_added,
+        weekly_points = u.weekly_points + points_added,
+        streak = u.streak + CASE WHEN streak_incremented THEN 1 ELSE 0 END,
+        last_daily_completion = CASE WHEN streak_incremented THEN CURRENT_DATE ELSE u.last_daily_completion END
+    WHERE u.user_id = p_user_id
+    RETURNING u.username, u.weekly_points, u.streak INTO username, weekly_points, streak;
+
+    status := 'completed';
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,11 @@
+-- Idempotency keys for the bulk endpoints (POST /quests/bulk, POST /user-quests/bulk).
+-- A batch_key is recorded in the same transaction as the rows it created, so a
+-- retried request finds it and gets the original response instead of new rows.
+
+CREATE TABLE IF NOT EXISTS bulk_batches (
+    batch_key VARCHAR(100) PRIMARY KEY, -- chosen by the client, one per logical request
+    endpoint VARCHAR(50) NOT NULL,
+    request_hash CHAR(64) NOT NULL, -- sha256 of the payload; a reused key with another payload is rejected
+    response JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,100 @@
+-- user_stats rollup for GET /journey/stats, kept current by triggers.
+-- Afterwards, fill it for existing users with `python rebuild_user_stats.py`
+-- (it works in user ranges, so writes are only held up briefly).
+
+-- Per-user counters behind GET /journey/stats, so the endpoint reads one row
+-- instead of counting. Statement-level triggers on the counted tables keep them
+-- current (bulk inserts update each user's row once per statement); users
+-- without a row have all counters at 0. rebuild_user_stats() recomputes them.
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    communities_joined INTEGER NOT NULL DEFAULT 0,
+    quests_completed INTEGER NOT NULL DEFAULT 0, -- user_quests rows with completed_at set
+    achievements_earned INTEGER NOT NULL DEFAULT 0
+);
+
+-- Trigger function: applies a statement's inserted rows (+1 each) and deleted
+-- rows (-1 each; updates have both) to user_stats column TG_ARGV[0]. Only rows
+-- meeting the condition in TG_ARGV[1] count. Users deleted meanwhile are skipped.
+CREATE OR REPLACE FUNCTION count_user_stats() RETURNS TRIGGER AS $$
+DECLARE
+    v_condition TEXT := COALESCE(TG_ARGV[1], 'TRUE');
+    v_rows TEXT;
+BEGIN
+    v_rows := CASE TG_OP
+        WHEN 'INSERT' THEN format('SELECT user_id, 1 AS delta FROM new_rows WHERE %s', v_condition)
+        WHEN 'DELETE' THEN format('SELECT user_id, -1 AS delta FROM old_rows WHERE %s', v_condition)
+        ELSE format('SELECT user_id, 1 AS delta FROM new_rows WHERE %1$s
+                     UNION ALL SELECT user_id, -1 FROM old_rows WHERE %1$s', v_condition)
+    END;
+    -- In user_id order, so concurrent statements lock users' rows in the same order
+    EXECUTE format(
+        'INSERT INTO user_stats AS s (user_id, %1$I)
+         SELECT d.user_id, SUM(d.delta) FROM (%2$s) d
+         JOIN users u ON u.user_id = d.user_id
+         GROUP BY d.user_id
+         HAVING SUM(d.delta) <> 0
+         ORDER BY d.user_id
+         ON CONFLICT (user_id) DO UPDATE SET %1$I = s.%1$I + EXCLUDED.%1$I',
+        TG_ARGV[0], v_rows
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS user_stats_quests_insert ON user_quests;
+CREATE TRIGGER user_stats_quests_insert AFTER INSERT ON user_quests
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('quests_completed', 'completed_at IS NOT NULL');
+DROP TRIGGER IF EXISTS user_stats_quests_update ON user_quests;
+CREATE TRIGGER user_stats_quests_update AFTER UPDATE ON user_quests
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('quests_completed', 'completed_at IS NOT NULL');
+DROP TRIGGER IF EXISTS user_stats_quests_delete ON user_quests;
+CREATE TRIGGER user_stats_quests_delete AFTER DELETE ON user_quests
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('quests_completed', 'completed_at IS NOT NULL');
+DROP TRIGGER IF EXISTS user_stats_communities_insert ON user_communities;
+CREATE TRIGGER user_stats_communities_insert AFTER INSERT ON user_communities
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('communities_joined');
+DROP TRIGGER IF EXISTS user_stats_communities_delete ON user_communities;
+CREATE TRIGGER user_stats_communities_delete AFTER DELETE ON user_communities
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('communities_joined');
+DROP TRIGGER IF EXISTS user_stats_achievements_insert ON user_achievements;
+CREATE TRIGGER user_stats_achievements_insert AFTER INSERT ON user_achievements
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('achievements_earned');
+DROP TRIGGER IF EXISTS user_stats_achievements_delete ON user_achievements;
+CREATE TRIGGER user_stats_achievements_delete AFTER DELETE ON user_achievements
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_user_stats('achievements_earned');
+
+-- Recomputes the counters of users p_from..p_to (all users by default) and
+-- returns how many rows were written. Writes to the counted tables wait until
+-- the calling transaction ends, so run large rebuilds in ranges
+-- (rebuild_user_stats.py does).
+CREATE OR REPLACE FUNCTION rebuild_user_stats(p_from INTEGER DEFAULT NULL, p_to INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    LOCK TABLE user_quests, user_communities, user_achievements IN SHARE MODE;
+
+    INSERT INTO user_stats AS s (user_id, communities_joined, quests_completed, achievements_earned)
+    SELECT u.user_id,
+           (SELECT COUNT(*) FROM user_communities c WHERE c.user_id = u.user_id),
+           (SELECT COUNT(*) FROM user_quests q WHERE q.user_id = u.user_id AND q.completed_at IS NOT NULL),
+           (SELECT COUNT(*) FROM user_achievements a WHERE a.user_id = u.user_id)
+    FROM users u
+    WHERE u.user_id BETWEEN COALESCE(p_from, 0) AND COALESCE(p_to, 2147483647)
+    ORDER BY u.user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET communities_joined = EXCLUDED.communities_joined,
+        quests_completed = EXCLUDED.quests_completed,
+        achievements_earned = EXCLUDED.achievements_earned;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
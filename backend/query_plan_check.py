@@ -0,0 +1,289 @@
+"""
+Query-plan regression check for the hot endpoint queries in crud.py.
+
+Builds the schema from database.sql in an EMPTY scratch database, seeds a
+large synthetic dataset (synthetic_data.py), then runs
+EXPLAIN (ANALYZE, BUFFERS) for each endpoint query. A query fails if its
+plan sequentially scans a large table or its execution time exceeds its
+latency budget. Exits non-zero on any failure so it can gate CI.
+
+Keep HOT_QUERIES in sync with the SQL in crud.py when endpoints change.
+
+Usage:
+    createdb starlife_plan_check
+    python query_plan_check.py --database-url postgresql://localhost/starlife_plan_check --users 50000
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import psycopg2
+
+import synthetic_data
+
+SCHEMA_FILE = Path(__file__).parent / "database.sql"
+
+# (name, sql, params, latency budget in ms). Params may reference the sample
+# ids chosen after seeding: {user_id}, {quest_id}, {community_quest_id}.
+HOT_QUERIES = [
+    ("get_user_data", "SELECT * FROM users WHERE user_id = %s", ("{user_id}",), 2),
+    ("check_in", """
+        UPDATE users
+        SET streak = CASE WHEN last_login < CURRENT_DATE - 1 THEN 0 ELSE streak END,
+            last_login = CURRENT_DATE
+        WHERE user_id = %s
+        RETURNING *
+    """, ("{user_id}",), 2),
+    ("get_user_quests", """
+        SELECT
+            quest_id,
+            bool_or(completed_at >= CURRENT_DATE) AS daily,
+            bool_or(completed_at >= date_trunc('week', CURRENT_DATE)) AS weekly,
+            bool_or(completed_at >= date_trunc('month', CURRENT_DATE)) AS monthly
+        FROM user_quests
+        WHERE user_id = %s
+        AND completed_at >= LEAST(date_trunc('week', CURRENT_DATE), date_trunc('month', CURRENT_DATE))
+        GROUP BY quest_id
+    """, ("{user_id}",), 5),
+    # complete_quest runs complete_user_quest(); EXPLAIN can't see inside the
+    # function, so its lookups are also checked individually
+    ("complete_quest", "SELECT * FROM complete_user_quest(%s, %s)", ("{user_id}", "{quest_id}"), 5),
+    ("complete_quest.duplicate_check", """
+        SELECT 1 FROM user_quests uq
+        WHERE uq.user_id = %s AND uq.quest_id = %s AND uq.completed_at >= date_trunc('week', CURRENT_DATE)
+    """, ("{user_id}", "{quest_id}"), 2),
+    ("complete_quest.daily_count", """
+        SELECT COUNT(DISTINCT uq.quest_id)
+        FROM user_quests uq
+        JOIN quests q ON uq.quest_id = q.quest_id
+        WHERE uq.user_id = %s AND q.quest_type = 'daily' AND q.is_active = TRUE
+          AND uq.completed_at >= CURRENT_DATE
+    """, ("{user_id}",), 5),
+    ("get_communities", """
+        SELECT c.community_id, c.community_name, c.community_description, c.community_color,
+               c.community_icon, c.member_count,
+               CASE WHEN uc.user_id IS NOT NULL THEN TRUE ELSE FALSE END as is_joined
+        FROM communities c
+        LEFT JOIN user_communities uc ON c.community_id = uc.community_id AND uc.user_id = %s
+        ORDER BY c.community_name
+    """, ("{user_id}",), 2),
+    ("get_community_quests", """
+        SELECT cq.community_quest_id, cq.community_id, c.community_name, c.community_color,
+               c.community_icon, cq.quest_name, cq.quest_description, cq.points_reward,
+               cq.event_date::text, cq.event_end_date::text,
+               CASE WHEN ucq.completed_at IS NOT NULL THEN TRUE ELSE FALSE END as completed
+        FROM community_quests cq
+        JOIN communities c ON cq.community_id = c.community_id
+        JOIN user_communities uc ON c.community_id = uc.community_id AND uc.user_id = %s
+        LEFT JOIN user_community_quests ucq ON cq.community_quest_id = ucq.community_quest_id AND ucq.user_id = %s
+        WHERE cq.is_active = TRUE
+        AND cq.event_end_date >= CURRENT_TIMESTAMP
+        ORDER BY cq.event_date
+    """, ("{user_id}", "{user_id}"), 10),
+    ("complete_community_quest.duplicate_check", """
+        SELECT * FROM user_community_quests WHERE user_id = %s AND community_quest_id = %s
+    """, ("{user_id}", "{community_quest_id}"), 2),
+    ("journey.community_breakdown", """
+        SELECT c.community_id, c.community_name, c.community_color, c.community_icon,
+               COALESCE(SUM(ucph.points_earned), 0) as total_points
+        FROM communities c
+        LEFT JOIN user_community_points_history ucph
+            ON c.community_id = ucph.community_id AND ucph.user_id = %s
+        GROUP BY c.community_id, c.community_name, c.community_color, c.community_icon
+        HAVING COALESCE(SUM(ucph.points_earned), 0) > 0
+        ORDER BY total_points DESC
+    """, ("{user_id}",), 5),
+    ("journey.points_timeline", """
+        SELECT TO_CHAR(recorded_at, 'YYYY-MM-DD') as date, total_points
+        FROM user_points_history
+        WHERE user_id = %s
+        ORDER BY recorded_at
+    """, ("{user_id}",), 5),
+    ("journey.health_metrics", """
+        SELECT metric_date::text, weight_kg, sleep_hours, water_intake_ml, steps,
+               workout_minutes, mood_score, energy_level
+        FROM user_health_metrics
+        WHERE user_id = %s
+        ORDER BY metric_date
+    """, ("{user_id}",), 10),
+    ("journey.achievements", """
+        SELECT achievement_title, achievement_description, achieved_at::text, achievement_type
+        FROM user_achievements
+        WHERE user_id = %s
+        ORDER BY achieved_at DESC
+    """, ("{user_id}",), 5),
+    ("journey.stats", """
+        SELECT u.created_at, EXTRACT(DAY FROM (CURRENT_TIMESTAMP - u.created_at)), u.points, u.streak,
+               COALESCE(s.communities_joined, 0), COALESCE(s.quests_completed, 0), COALESCE(s.achievements_earned, 0)
+        FROM users u
+        LEFT JOIN user_stats s ON s.user_id = u.user_id
+        WHERE u.user_id = %s
+    """, ("{user_id}",), 2),
+    # /journey/{user_id} with its default one-year range
+    ("journey.points", """
+        SELECT DISTINCT ON (bucket) TO_CHAR(bucket, 'YYYY-MM-DD'), total_points
+        FROM (
+            SELECT date_trunc(%s, recorded_at) as bucket, recorded_at, total_points
+            FROM user_points_history
+            WHERE user_id = %s AND recorded_at >= CURRENT_DATE - 365 AND recorded_at < CURRENT_DATE + 1
+        ) history
+        ORDER BY bucket, recorded_at DESC
+    """, ("week", "{user_id}"), 5),
+    ("journey.health", """
+        SELECT date_trunc(%s, metric_date::timestamp)::date::text, COUNT(*),
+               ROUND(AVG(weight_kg), 2), ROUND(AVG(sleep_hours), 2), ROUND(AVG(water_intake_ml))::int,
+               ROUND(AVG(steps))::int, ROUND(AVG(workout_minutes))::int,
+               ROUND(AVG(mood_score), 1), ROUND(AVG(energy_level), 1)
+        FROM user_health_metrics
+        WHERE user_id = %s AND metric_date >= CURRENT_DATE - 365 AND metric_date < CURRENT_DATE + 1
+        GROUP BY 1
+        ORDER BY 1
+    """, ("day", "{user_id}"), 5),
+    ("journey.communities", """
+        SELECT c.community_id, c.community_name, c.community_color, c.community_icon,
+               SUM(ucph.points_earned) as total_points
+        FROM user_community_points_history ucph
+        JOIN communities c ON c.community_id = ucph.community_id
+        WHERE ucph.user_id = %s AND ucph.earned_at >= CURRENT_DATE - 365 AND ucph.earned_at < CURRENT_DATE + 1
+        GROUP BY c.community_id
+        HAVING SUM(ucph.points_earned) > 0
+        ORDER BY total_points DESC
+    """, ("{user_id}",), 5),
+    ("journey.achievements_range", """
+        SELECT achievement_title, achievement_description, achieved_at::text, achievement_type
+        FROM user_achievements
+        WHERE user_id = %s AND achieved_at >= CURRENT_DATE - 365 AND achieved_at < CURRENT_DATE + 1
+        ORDER BY achieved_at DESC
+        LIMIT 50
+    """, ("{user_id}",), 5),
+    ("get_user_purchases", """
+        SELECT up.purchase_id, sp.product_name, sp.product_category, up.original_price,
+               up.discount_applied, up.final_price, up.user_tier, up.purchase_date
+        FROM user_purchases up
+        JOIN store_products sp ON up.product_id = sp.product_id
+        WHERE up.user_id = %s
+        ORDER BY up.purchase_date DESC
+    """, ("{user_id}",), 5),
+]
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def _large_tables(cur, min_rows: int) -> set[str]:
+    cur.execute("""
+        SELECT relname FROM pg_class
+        WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace AND reltuples >= %s
+    """, (min_rows,))
+    return {row[0] for row in cur.fetchall()}
+
+
+def _sample_ids(cur) -> dict:
+    """A representative synthetic user plus a quest and event to probe with."""
+    cur.execute("""
+        SELECT user_id FROM users WHERE username LIKE 'synthetic_%%'
+        ORDER BY user_id OFFSET (SELECT COUNT(*) / 2 FROM users WHERE username LIKE 'synthetic_%%') LIMIT 1
+    """)
+    user_id = cur.fetchone()[0]
+    cur.execute("SELECT MIN(quest_id) FROM quests WHERE quest_type = 'daily' AND is_active")
+    quest_id = cur.fetchone()[0]
+    cur.execute("SELECT MIN(community_quest_id) FROM community_quests WHERE is_active")
+    community_quest_id = cur.fetchone()[0]
+    return {"user_id": user_id, "quest_id": quest_id, "community_quest_id": community_quest_id}
+
+
+def check_plans(conn, min_rows: int, budget_scale: float, repeat: int) -> list[dict]:
+    results = []
+    with conn.cursor() as cur:
+        large = _large_tables(cur, min_rows)
+        ids = _sample_ids(cur)
+    conn.rollback()
+
+    for name, sql, params, budget_ms in HOT_QUERIES:
+        bound = tuple(ids[p[1:-1]] if isinstance(p, str) and p.startswith("{") else p for p in params)
+        best_ms = None
+        plan = None
+        # Best of N runs so a cold cache on the first run doesn't count against the budget
+        for _ in range(repeat):
+            with conn.cursor() as cur:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, bound)
+                explained = cur.fetchone()[0][0]
+            conn.rollback()  # EXPLAIN ANALYZE executes writes; never keep them
+            if best_ms is None or explained["Execution Time"] < best_ms:
+                best_ms = explained["Execution Time"]
+                plan = explained["Plan"]
+
+        seq_scans = sorted({
+            node["Relation Name"] for node in _walk(plan)
+            if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in large
+        })
+        budget = budget_ms * budget_scale
+        problems = []
+        if seq_scans:
+            problems.append(f"seq scan on {', '.join(seq_scans)}")
+        if best_ms > budget:
+            problems.append(f"{best_ms:.2f}ms > {budget:.2f}ms budget")
+        results.append({"name": name, "ms": best_ms, "budget_ms": budget, "problems": problems, "plan": plan})
+    return results
+
+
+def _prepare_database(conn, users: int, days: int, seed: int):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('public.users') IS NOT NULL")
+        if cur.fetchone()[0]:
+            raise SystemExit(
+                "Refusing to seed: the target database already has a schema. "
+                "Point --database-url at an empty scratch database, or pass --reuse to check an already seeded one."
+            )
+        cur.execute(SCHEMA_FILE.read_text())
+    conn.commit()
+    print(f"🌱 Seeding {users} synthetic users with {days} days of history...")
+    synthetic_data.generate(conn, users, days, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check hot query plans against a large synthetic dataset")
+    parser.add_argument("--database-url", default=os.getenv("PLAN_CHECK_DATABASE_URL"),
+                        help="Empty scratch database (or PLAN_CHECK_DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reuse", action="store_true", help="Skip schema creation and seeding")
+    parser.add_argument("--min-rows", type=int, default=10_000,
+                        help="Tables with at least this many rows must not be sequentially scanned")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiply every latency budget")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--show-plans", action="store_true", help="Print the plan of every failing query")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url or PLAN_CHECK_DATABASE_URL is required")
+
+    conn = psycopg2.connect(args.database_url)
+    try:
+        if not args.reuse:
+            _prepare_database(conn, args.users, args.days, args.seed)
+        results = check_plans(conn, args.min_rows, args.budget_scale, args.repeat)
+    finally:
+        conn.close()
+
+    failures = [r for r in results if r["problems"]]
+    print()
+    for r in results:
+        status = "❌" if r["problems"] else "✅"
+        print(f"{status} {r['name']:<42} {r['ms']:8.2f}ms / {r['budget_ms']:.0f}ms  {'; '.join(r['problems'])}")
+        if r["problems"] and args.show_plans:
+            print(json.dumps(r["plan"], indent=2))
+
+    print(f"\n{len(results) - len(failures)}/{len(results)} queries within plan and latency budgets")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
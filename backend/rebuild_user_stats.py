@@ -0,0 +1,67 @@
+"""
+Rebuilds the user_stats counters behind GET /journey/stats from the counted
+tables (user_communities, user_quests, user_achievements).
+
+Triggers keep the counters current on their own. Run this once after applying
+migrations/005_user_stats.sql, and again if they drift (rows changed with
+triggers disabled, TRUNCATE, partial restores). Users are rebuilt in ranges of
+--chunk-size, each in its own transaction: writes to the counted tables wait
+for one range at a time instead of the whole rebuild.
+
+Usage:
+    python rebuild_user_stats.py --database-url postgresql://localhost/starlife_db
+    python rebuild_user_stats.py --from-user 5000 --to-user 6000
+"""
+
+import argparse
+import os
+import time
+
+import psycopg2
+
+
+def rebuild(conn, first: int | None = None, last: int | None = None, chunk_size: int = 10_000,
+            verbose: bool = True) -> dict:
+    """Recomputes users first..last (default: all) chunk by chunk; returns rows written and seconds taken."""
+    started = time.monotonic()
+    with conn.cursor() as cur:
+        cur.execute("SELECT MIN(user_id), MAX(user_id) FROM users")
+        low, high = cur.fetchone()
+    conn.commit()
+    if low is None:
+        return {"users": 0, "seconds": 0.0}
+    low, high = max(low, first or low), min(high, last or high)
+
+    rows = 0
+    for start in range(low, high + 1, chunk_size):
+        end = min(start + chunk_size - 1, high)
+        with conn.cursor() as cur:
+            cur.execute("SELECT rebuild_user_stats(%s, %s)", (start, end))
+            rows += cur.fetchone()[0]
+        conn.commit()
+        if verbose:
+            print(f"  rebuilt users {start}-{end} ({time.monotonic() - started:.1f}s)")
+    return {"users": rows, "seconds": round(time.monotonic() - started, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the user_stats counters")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--from-user", type=int, help="first user_id to rebuild (default: lowest)")
+    parser.add_argument("--to-user", type=int, help="last user_id to rebuild (default: highest)")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="users per transaction")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+
+    conn = psycopg2.connect(args.database_url)
+    try:
+        result = rebuild(conn, args.from_user, args.to_user, args.chunk_size)
+    finally:
+        conn.close()
+    print(f"✅ Rebuilt counters for {result['users']} users in {result['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
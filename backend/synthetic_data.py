@@ -0,0 +1,222 @@
+"""
+Seeded synthetic dataset generator for the StarLife schema (database.sql).
+
+Adds `users` synthetic users on top of the seed data, each with
+`days` of history: quest completions, community memberships and event
+completions, points history, daily health metrics, achievements and
+store purchases. Rows are generated server-side with generate_series in
+chunks of users, so it scales to millions of users without building
+rows in Python. The same seed and arguments always produce the same data.
+
+Usage:
+    DATABASE_URL=postgresql://... python synthetic_data.py --users 100000 --days 365 --seed 42
+"""
+
+import argparse
+import math
+import os
+import time
+
+import psycopg2
+
+CHUNK_SIZE = 10_000
+
+# Per-user densities. Quest completions and community events scale with `days`.
+QUEST_COMPLETIONS_PER_DAY = 1.5
+COMMUNITY_JOIN_PROBABILITY = 0.4
+EVENTS_PER_COMMUNITY_PER_WEEK = 2
+EVENT_COMPLETION_PROBABILITY = 0.05
+ACHIEVEMENTS_PER_USER = 6
+PURCHASES_PER_USER = 3
+
+
+def _seed_catalog(cur, days: int):
+    """Community events spread across the history window, plus some upcoming ones."""
+    events_per_community = max(1, days * EVENTS_PER_COMMUNITY_PER_WEEK // 7)
+    cur.execute("""
+        WITH e AS (
+            SELECT c.community_id, g,
+                   CURRENT_TIMESTAMP - (%s * random() - 14) * interval '1 day' AS event_start
+            FROM communities c CROSS JOIN generate_series(1, %s) g
+        )
+        INSERT INTO community_quests (community_id, quest_name, quest_description, points_reward,
+                                      event_date, event_end_date, is_active)
+        SELECT community_id,
+               'Synthetic Event ' || g,
+               'Generated community event',
+               (100 + floor(random() * 9) * 50)::int,
+               event_start,
+               event_start + interval '3 hours',
+               event_start > CURRENT_TIMESTAMP - interval '30 days'
+        FROM e
+    """, (days, events_per_community))
+
+
+def _seed_users(cur, first_user: int, count: int, days: int):
+    """Inserts one chunk of users and all of their history; returns the user_id range."""
+    cur.execute("""
+        INSERT INTO users (username, email, points, spent_points, weekly_points, streak,
+                           last_login, last_daily_completion, created_at)
+        SELECT 'synthetic_' || g,
+               'synthetic_' || g || '@example.com',
+               floor(random() * 20000)::int,
+               floor(random() * 5000)::int,
+               floor(random() * 800)::int,
+               floor(random() * 200)::int,
+               CURRENT_DATE - floor(random() * 3)::int,
+               CURRENT_DATE - floor(random() * 3)::int,
+               CURRENT_TIMESTAMP - %s * interval '1 day'
+        FROM generate_series(%s, %s) g
+        RETURNING user_id
+    """, (days, first_user, first_user + count - 1))
+    ids = [row[0] for row in cur.fetchall()]
+    lo, hi = min(ids), max(ids)
+
+    completions = max(1, int(days * QUEST_COMPLETIONS_PER_DAY))
+    cur.execute("""
+        WITH q AS (SELECT array_agg(quest_id ORDER BY quest_id) AS ids FROM quests WHERE is_active)
+        INSERT INTO user_quests (user_id, quest_id, status, completed_at)
+        SELECT u, q.ids[1 + floor(random() * array_length(q.ids, 1))::int], 'completed',
+               CURRENT_TIMESTAMP - random() * %s * interval '1 day'
+        FROM q, generate_series(%s, %s) u, generate_series(1, %s) n
+    """, (days, lo, hi, completions))
+
+    cur.execute("""
+        INSERT INTO user_communities (user_id, community_id, joined_at)
+        SELECT u, c.community_id, CURRENT_TIMESTAMP - random() * %s * interval '1 day'
+        FROM generate_series(%s, %s) u CROSS JOIN communities c
+        WHERE random() < %s
+        ON CONFLICT DO NOTHING
+    """, (days, lo, hi, COMMUNITY_JOIN_PROBABILITY))
+
+    cur.execute("""
+        INSERT INTO user_community_quests (user_id, community_quest_id, status, completed_at)
+        SELECT uc.user_id, cq.community_quest_id, 'completed', cq.event_end_date
+        FROM user_communities uc
+        JOIN community_quests cq ON cq.community_id = uc.community_id
+        WHERE uc.user_id BETWEEN %s AND %s
+          AND cq.event_end_date < CURRENT_TIMESTAMP
+          AND random() < %s
+        ON CONFLICT DO NOTHING
+    """, (lo, hi, EVENT_COMPLETION_PROBABILITY))
+
+    cur.execute("""
+        INSERT INTO user_community_points_history (user_id, community_id, points_earned, quest_completed, earned_at)
+        SELECT ucq.user_id, cq.community_id, cq.points_reward, cq.quest_name, ucq.completed_at
+        FROM user_community_quests ucq
+        JOIN community_quests cq ON cq.community_quest_id = ucq.community_quest_id
+        WHERE ucq.user_id BETWEEN %s AND %s
+    """, (lo, hi))
+
+    # Weekly points snapshots with a running total
+    cur.execute("""
+        WITH d AS (
+            SELECT u, w, floor(random() * 500)::int AS delta
+            FROM generate_series(%s, %s) u, generate_series(0, %s / 7) w
+        )
+        INSERT INTO user_points_history (user_id, total_points, points_change, activity_description, recorded_at)
+        SELECT u, SUM(delta) OVER (PARTITION BY u ORDER BY w), delta, 'Weekly progress',
+               CURRENT_TIMESTAMP - (%s - w * 7) * interval '1 day'
+        FROM d
+    """, (lo, hi, days, days))
+
+    cur.execute("""
+        INSERT INTO user_health_metrics (user_id, metric_date, weight_kg, sleep_hours, water_intake_ml,
+                                         steps, heart_rate_avg, workout_minutes, calories_burned,
+                                         mood_score, stress_level, energy_level)
+        SELECT u, CURRENT_DATE - d,
+               round((60 + random() * 40)::numeric, 2),
+               round((5 + random() * 4)::numeric, 2),
+               1500 + floor(random() * 2000)::int,
+               3000 + floor(random() * 12000)::int,
+               60 + floor(random() * 25)::int,
+               floor(random() * 90)::int,
+               200 + floor(random() * 700)::int,
+               1 + floor(random() * 10)::int,
+               1 + floor(random() * 10)::int,
+               1 + floor(random() * 10)::int
+        FROM generate_series(%s, %s) u, generate_series(0, %s - 1) d
+    """, (lo, hi, days))
+
+    cur.execute("""
+        INSERT INTO user_achievements (user_id, achievement_type, achievement_title, achievement_description, achieved_at)
+        SELECT u,
+               (ARRAY['streak', 'points_milestone', 'quest_completion', 'community_joined'])[1 + floor(random() * 4)::int],
+               'Synthetic Achievement ' || n,
+               'Generated achievement',
+               CURRENT_TIMESTAMP - random() * %s * interval '1 day'
+        FROM generate_series(%s, %s) u, generate_series(1, %s) n
+    """, (days, lo, hi, ACHIEVEMENTS_PER_USER))
+
+    cur.execute("""
+        WITH p AS (SELECT array_agg(product_id ORDER BY product_id) AS ids FROM store_products),
+        picks AS (
+            SELECT u, p.ids[1 + floor(random() * array_length(p.ids, 1))::int] AS product_id,
+                   CURRENT_TIMESTAMP - random() * %s * interval '1 day' AS purchase_date
+            FROM p, generate_series(%s, %s) u, generate_series(1, %s) n
+        )
+        INSERT INTO user_purchases (user_id, product_id, original_price, discount_applied, final_price,
+                                    user_tier, purchase_date)
+        SELECT picks.u, sp.product_id, sp.base_price, 0, sp.base_price, 'Bronze', picks.purchase_date
+        FROM picks JOIN store_products sp ON sp.product_id = picks.product_id
+    """, (days, lo, hi, PURCHASES_PER_USER))
+
+    return lo, hi
+
+
+def generate(conn, users: int, days: int, seed: int = 42, verbose: bool = True) -> dict:
+    """
+    Seeds `users` synthetic users with `days` of history into an initialised
+    schema. Each chunk commits on its own, so progress survives interruptions.
+    """
+    started = time.monotonic()
+    with conn.cursor() as cur:
+        cur.execute("SELECT setseed(%s)", (math.sin(seed),))
+        cur.execute("SELECT COALESCE(MAX(user_id), 0) FROM users")
+        first_user = cur.fetchone()[0] + 1
+        _seed_catalog(cur, days)
+    conn.commit()
+
+    seeded = 0
+    while seeded < users:
+        count = min(CHUNK_SIZE, users - seeded)
+        with conn.cursor() as cur:
+            # Each chunk gets its own seed so its rows don't depend on how much randomness earlier chunks used
+            cur.execute("SELECT setseed(%s)", (math.sin(seed * 1000 + first_user + seeded),))
+            _seed_users(cur, first_user + seeded, count, days)
+        conn.commit()
+        seeded += count
+        if verbose:
+            print(f"  seeded {seeded}/{users} users ({time.monotonic() - started:.1f}s)")
+
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+    finally:
+        conn.autocommit = False
+
+    return {"users": users, "days": days, "seconds": round(time.monotonic() - started, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic StarLife data")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=90, help="Days of history per user")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+
+    conn = psycopg2.connect(args.database_url)
+    try:
+        result = generate(conn, args.users, args.days, args.seed)
+    finally:
+        conn.close()
+    print(f"✅ Seeded {result['users']} users with {result['days']} days of history in {result['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
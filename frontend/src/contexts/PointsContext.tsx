@@ -1,4 +1,4 @@
-import React, { createContext, useState, useContext, ReactNode, useEffect } from 'react';
+import React, { createContext, useState, useContext, ReactNode, useEffect, useRef } from 'react';
 
 // --- TypeScript Interfaces ---
 export interface Quest {
@@ -31,6 +31,15 @@ export interface User {
   last_daily_completion?: string;
 }
 
+export type DashboardSection = 'user' | 'quests' | 'rewards' | 'leaderboard';
+
+interface Dashboard {
+  user: User | null;
+  quests: Quest[] | null;
+  rewards: Reward[] | null;
+  leaderboard: User[] | null;
+}
+
 interface PointsContextType {
   user: User | null;
   quests: Quest[];
@@ -41,7 +50,7 @@ interface PointsContextType {
   completeQuest: (questId: number) => Promise<void>;
   claimReward: (rewardId: number) => Promise<void>;
   resetQuests: () => Promise<void>;
-  fetchData: () => Promise<void>;
+  fetchData: (sections?: DashboardSection[]) => Promise<void>;
 }
 
 const PointsContext = createContext<PointsContextType | undefined>(undefined);
@@ -55,36 +64,75 @@ export const PointsProvider: React.FC<{ children: ReactNode }> = ({ children })
   const [rewards, setRewards] = useState<Reward[]>([]);
   const [leaderboard, setLeaderboard] = useState<User[]>([]);
   const [showCongratulations, setShowCongratulations] = useState<boolean>(false);
+  // True while the /events stream is open; mutations then rely on pushed deltas instead of refetching
+  const eventsConnected = useRef<boolean>(false);
 
-  const fetchData = async () => {
+  // Loads the requested sections (all by default) in a single request
+  const fetchData = async (sections?: DashboardSection[]) => {
     try {
-      const [userRes, questsRes, rewardsRes, leaderboardRes] = await Promise.all([
-        fetch(`${API_URL}/user/${USER_ID}`),
-        fetch(`${API_URL}/quests/${USER_ID}`),
-        fetch(`${API_URL}/rewards`),
-        fetch(`${API_URL}/leaderboard`),
-      ]);
-
-      if (!userRes.ok || !questsRes.ok || !rewardsRes.ok || !leaderboardRes.ok) {
+      const include = sections ? `?include=${sections.join(',')}` : '';
+      const response = await fetch(`${API_URL}/dashboard/${USER_ID}${include}`);
+
+      if (!response.ok) {
         throw new Error('Failed to fetch data from the server.');
       }
 
-      const userData: User = await userRes.json();
-      const questsData: Quest[] = await questsRes.json();
-      const rewardsData: Reward[] = await rewardsRes.json();
-      const leaderboardData: User[] = await leaderboardRes.json();
+      const data: Dashboard = await response.json();
 
-      setUser(userData);
-      setQuests(questsData);
-      setRewards(rewardsData);
-      setLeaderboard(leaderboardData);
+      if (data.user) setUser(data.user);
+      if (data.quests) setQuests(data.quests);
+      if (data.rewards) setRewards(data.rewards);
+      if (data.leaderboard) setLeaderboard(data.leaderboard);
     } catch (error) {
       console.error('Error fetching data:', error);
     }
   };
 
   useEffect(() => {
-    fetchData();
+    const init = async () => {
+      // Record today's visit first so the streak check runs before the user is read
+      try {
+        await fetch(`${API_URL}/user/${USER_ID}/check-in`, { method: 'POST' });
+      } catch (error) {
+        console.error('Error checking in:', error);
+      }
+      await fetchData();
+    };
+    init();
+  }, []);
+
+  useEffect(() => {
+    const source = new EventSource(`${API_URL}/events/${USER_ID}`);
+    let dropped = false;
+
+    source.onopen = () => {
+      eventsConnected.current = true;
+      // Deltas sent while the stream was down are lost; reload once it's back
+      if (dropped) fetchData();
+    };
+    source.onerror = () => {
+      // EventSource reconnects by itself; fall back to refetching until it does
+      eventsConnected.current = false;
+      dropped = true;
+    };
+
+    const on = <T,>(event: string, handler: (data: T) => void) => {
+      source.addEventListener(event, (e) => handler(JSON.parse((e as MessageEvent).data)));
+    };
+
+    on<Partial<User>>('user', (data) => setUser((prev) => prev && { ...prev, ...data }));
+    on<{ quest_id: number; points_added: number }>('quest_completed', (data) => {
+      setQuests((prev) => prev.map((q) => (q.quest_id === data.quest_id ? { ...q, completed: true } : q)));
+      setUser((prev) => prev && { ...prev, points: prev.points + data.points_added });
+    });
+    on('quests_reset', () => setQuests((prev) => prev.map((q) => ({ ...q, completed: false }))));
+    on<{ top: User[] }>('leaderboard', (data) => setLeaderboard(data.top));
+    on('resync', () => fetchData());
+
+    return () => {
+      eventsConnected.current = false;
+      source.close();
+    };
   }, []);
 
 
@@ -108,8 +156,10 @@ export const PointsProvider: React.FC<{ children: ReactNode }> = ({ children })
         setShowCongratulations(true);
       }
 
-      // Re-fetch all data to ensure UI is in sync
-      await fetchData();
+      // The event stream pushes the changes; refetch only when it's down
+      if (!eventsConnected.current) {
+        await fetchData(['user', 'quests', 'leaderboard']);
+      }
     } catch (error) {
       console.error('Error completing quest:', error);
       throw error;
@@ -128,8 +178,9 @@ export const PointsProvider: React.FC<{ children: ReactNode }> = ({ children })
         throw new Error(errorData.detail || 'Failed to claim reward');
       }
 
-      // Re-fetch user data to show updated points and leaderboard
-      await fetchData();
+      if (!eventsConnected.current) {
+        await fetchData(['user']);
+      }
     } catch (error) {
       console.error('Error claiming reward:', error);
       throw error;
@@ -147,8 +198,9 @@ export const PointsProvider: React.FC<{ children: ReactNode }> = ({ children })
         throw new Error(errorData.detail || 'Failed to reset quests');
       }
 
-      // Re-fetch all data
-      await fetchData();
+      if (!eventsConnected.current) {
+        await fetchData(['quests']);
+      }
     } catch (error) {
       console.error('Error resetting quests:', error);
       throw error;
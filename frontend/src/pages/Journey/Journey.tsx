@@ -26,6 +26,14 @@ ChartJS.register(
 
 const API_URL = 'http://localhost:8000';
 const USER_ID = 1;
+// The charts show monthly averages over the last few years
+const HISTORY_YEARS = 3;
+const HEALTH_METRICS = 'weight_kg,sleep_hours,water_intake_ml,steps';
+
+// Bucket dates are plain days ("2024-05-01"), which Date parses as UTC midnight;
+// format them in UTC too so they don't shift to the previous day west of UTC
+const formatBucket = (date: string, options: Intl.DateTimeFormatOptions) =>
+  new Date(date).toLocaleDateString('en-US', { ...options, timeZone: 'UTC' });
 
 interface CommunityBreakdown {
   community_id: number;
@@ -41,7 +49,8 @@ interface PointsHistory {
 }
 
 interface HealthMetric {
-  metric_date: string;
+  date: string;
+  days: number;
   weight_kg: number | null;
   sleep_hours: number | null;
   water_intake_ml: number | null;
@@ -82,25 +91,21 @@ const Journey: React.FC = () => {
 
   const fetchAllData = async () => {
     try {
-      const [communityRes, pointsRes, healthRes, achievementsRes, statsRes] = await Promise.all([
-        fetch(`${API_URL}/journey/community-breakdown/${USER_ID}`),
-        fetch(`${API_URL}/journey/points-timeline/${USER_ID}`),
-        fetch(`${API_URL}/journey/health-metrics/${USER_ID}`),
-        fetch(`${API_URL}/journey/achievements/${USER_ID}`),
-        fetch(`${API_URL}/journey/stats/${USER_ID}`),
-      ]);
-
-      const communityData = await communityRes.json();
-      const pointsData = await pointsRes.json();
-      const healthData = await healthRes.json();
-      const achievementsData = await achievementsRes.json();
-      const statsData = await statsRes.json();
+      const from = new Date();
+      from.setFullYear(from.getFullYear() - HISTORY_YEARS);
+      const params = new URLSearchParams({
+        from: from.toISOString().slice(0, 10),
+        resolution: 'month',
+        health_metrics: HEALTH_METRICS,
+      });
+      const res = await fetch(`${API_URL}/journey/${USER_ID}?${params}`);
+      const data = await res.json();
 
-      setCommunityBreakdown(communityData);
-      setPointsHistory(pointsData);
-      setHealthMetrics(healthData);
-      setAchievements(achievementsData);
-      setStats(statsData);
+      setCommunityBreakdown(data.communities);
+      setPointsHistory(data.points);
+      setHealthMetrics(data.health);
+      setAchievements(data.achievements);
+      setStats(data.stats);
       setLoading(false);
     } catch (error) {
       console.error('Error fetching journey data:', error);
@@ -132,7 +137,7 @@ const Journey: React.FC = () => {
 
   // Line Chart Data - Points Over Time
   const lineData = {
-    labels: pointsHistory.map(p => new Date(p.date).toLocaleDateString('en-US', { month: 'short', year: '2-digit' })),
+    labels: pointsHistory.map(p => formatBucket(p.date, { month: 'short', year: '2-digit' })),
     datasets: [
       {
         label: 'Total Points',
@@ -149,7 +154,7 @@ const Journey: React.FC = () => {
 
   // Health Metrics Charts
   const weightData = {
-    labels: healthMetrics.map(m => new Date(m.metric_date).toLocaleDateString('en-US', { month: 'short' })),
+    labels: healthMetrics.map(m => formatBucket(m.date, { month: 'short' })),
     datasets: [
       {
         label: 'Weight (kg)',
@@ -163,7 +168,7 @@ const Journey: React.FC = () => {
   };
 
   const sleepData = {
-    labels: healthMetrics.map(m => new Date(m.metric_date).toLocaleDateString('en-US', { month: 'short' })),
+    labels: healthMetrics.map(m => formatBucket(m.date, { month: 'short' })),
     datasets: [
       {
         label: 'Sleep (hours)',
@@ -177,7 +182,7 @@ const Journey: React.FC = () => {
   };
 
   const hydrationData = {
-    labels: healthMetrics.map(m => new Date(m.metric_date).toLocaleDateString('en-US', { month: 'short' })),
+    labels: healthMetrics.map(m => formatBucket(m.date, { month: 'short' })),
     datasets: [
       {
         label: 'Water Intake (ml)',
@@ -191,7 +196,7 @@ const Journey: React.FC = () => {
   };
 
   const stepsData = {
-    labels: healthMetrics.map(m => new Date(m.metric_date).toLocaleDateString('en-US', { month: 'short' })),
+    labels: healthMetrics.map(m => formatBucket(m.date, { month: 'short' })),
     datasets: [
       {
         label: 'Daily Steps',